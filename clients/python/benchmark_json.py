@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+JSON codec benchmark
+
+Measures every installed backend of json_codec on synthetic 172-hour API
+responses (the full GSM forecast length):
+
+- decode_forecast: response bytes -> Forecast (client hot path)
+- loads: response bytes -> dicts (proxy hot path)
+- encode: compact bytes of the forecast rows (proxy / bulk export)
+- dumps indent: indented str of the forecast rows (MCP JSON output)
+
+Usage:
+    python3 benchmark_json.py [--hours 172] [--repeat 5] [--number 200]
+"""
+
+import argparse
+import json
+import random
+import sys
+import timeit
+from datetime import datetime, timedelta
+from typing import Any, Dict
+
+try:
+    from . import json_codec
+except ImportError:
+    import json_codec
+
+
+def sample_response(hours: int = 172, seed: int = 0) -> Dict[str, Any]:
+    """Build an API response with realistic values and precision
+
+    Args:
+        hours: Number of forecast hours
+        seed: Random seed
+
+    Returns:
+        dict: Response in the API format
+    """
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1, 9)
+    forecast = [
+        {
+            'datetime': (start + timedelta(hours=h)).strftime('%Y-%m-%d %H:%M:%S'),
+            'TMP': round(rng.uniform(-5, 35), 2),
+            'APCP': round(max(0.0, rng.gauss(0, 3)), 3),
+            'WSPD': round(rng.uniform(0, 20), 2),
+            'WDIR': round(rng.uniform(0, 360), 1),
+            'RH': round(rng.uniform(20, 100), 1),
+            'TCDC': round(rng.uniform(0, 100), 1),
+            'PRES': round(rng.uniform(990, 1030), 1),
+        }
+        for h in range(hours)
+    ]
+    return {
+        'code': 200,
+        'result': {
+            'latlng': '35.7,139.625',
+            'grib2file_time': '2025-01-01 06:00:00',
+            'forecast': forecast,
+        },
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='JSON codec benchmark')
+    parser.add_argument('--hours', type=int, default=172, help='Forecast hours per response')
+    parser.add_argument('--repeat', type=int, default=5, help='Timing runs (best is reported)')
+    parser.add_argument('--number', type=int, default=200, help='Operations per timing run')
+    args = parser.parse_args()
+
+    payload = json.dumps(sample_response(args.hours)).encode('utf-8')
+    reference = json_codec.get_codec('json').decode_forecast(payload, args.hours)
+    rows = reference.to_dicts()
+
+    print(f"Payload: {args.hours} hours, {len(payload) / 1024:.1f} KiB")
+    codec, forecast_codec = json_codec.default_codecs()
+    print(f"Backends: {', '.join(json_codec.installed_codecs())} "
+          f"(default: {codec.name}, forecasts: {forecast_codec.name})\n")
+
+    operations = {
+        'decode_forecast': lambda codec: codec.decode_forecast(payload, args.hours),
+        'loads': lambda codec: codec.loads(payload),
+        'encode': lambda codec: codec.encode(rows),
+        'dumps indent': lambda codec: codec.dumps(rows, indent=True),
+    }
+
+    baseline = {}
+    print(f"{'operation':<16} {'backend':<8} {'us/op':>10} {'MiB/s':>8} {'speedup':>8}")
+    for operation, run in operations.items():
+        # The standard library backend first: speedups are relative to it
+        for name, codec in sorted(json_codec.installed_codecs().items(), key=lambda item: item[0] != 'json'):
+            if operation == 'decode_forecast':
+                decoded = codec.decode_forecast(payload, args.hours)
+                # Compared as text so that 0 and 0.0 count as different
+                if json.dumps(decoded.to_dicts()) != json.dumps(rows):
+                    print(f"❌ {name}: decoded forecast differs from the json backend")
+                    return 1
+
+            best = min(timeit.repeat(lambda: run(codec), repeat=args.repeat, number=args.number))
+            per_op = best / args.number
+            baseline.setdefault(operation, per_op)
+            print(f"{operation:<16} {name:<8} {per_op * 1e6:>10.1f} "
+                  f"{len(payload) / per_op / 2 ** 20:>8.1f} {baseline[operation] / per_op:>7.1f}x")
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,462 @@
+#!/usr/bin/env python3
+"""
+Bulk forecast export for large point lists
+
+Streams coordinates from a CSV file, fetches forecasts concurrently
+(one request per grid cell), and streams the results out as CSV, NDJSON
+or Parquet (when pyarrow is installed). Memory use is bounded by the
+window size, and progress is checkpointed so an interrupted run can be
+resumed.
+
+Usage:
+    python3 bulk_export.py points.csv -o forecasts.csv --hours 24 --workers 16
+    python3 bulk_export.py points.csv -o forecasts.ndjson --resume
+
+    # Distributed: each node exports the grid cells of its shard, then merge
+    python3 bulk_export.py points.csv -o part-0.csv --shard 0/4
+    python3 bulk_export.py --merge part-0.csv part-1.csv part-2.csv part-3.csv -o forecasts.csv
+
+The input CSV needs a header with latitude/longitude columns
+(``lat``/``latitude`` and ``lng``/``lon``/``longitude``) and may have an
+``id`` column. Rows without valid coordinates are reported as per-point
+errors instead of stopping the export.
+"""
+
+import argparse
+import csv
+import json
+import math
+import os
+import sys
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    from . import json_codec
+    from .grid import GridCell, grid_cell
+    from .scheduler import PRIORITY_BULK
+    from .sharding import ShardSpec, merge_outputs, shard_points
+    from .weather_forecast_client import (
+        BINARY_FIELDS, Forecast, WeatherAPIError, WeatherForecastClient
+    )
+except ImportError:
+    import json_codec
+    from grid import GridCell, grid_cell
+    from scheduler import PRIORITY_BULK
+    from sharding import ShardSpec, merge_outputs, shard_points
+    from weather_forecast_client import (
+        BINARY_FIELDS, Forecast, WeatherAPIError, WeatherForecastClient
+    )
+
+
+LATITUDE_COLUMNS = ('lat', 'latitude')
+LONGITUDE_COLUMNS = ('lng', 'lon', 'longitude')
+
+CSV_COLUMNS = (
+    'seq', 'id', 'latitude', 'longitude', 'grid_latitude', 'grid_longitude',
+    'grib2file_time', 'datetime'
+) + BINARY_FIELDS
+
+# (seq, id, latitude, longitude); coordinates are None for invalid input rows
+Point = Tuple[int, str, Optional[float], Optional[float]]
+
+INVALID_POINT_ERROR = 'Invalid input row: latitude/longitude must be finite numbers in range'
+
+
+def parse_coordinates(latitude: str, longitude: str) -> Optional[Tuple[float, float]]:
+    """Parse a coordinate pair, or return None if it is not a valid location"""
+    try:
+        lat, lng = float(latitude), float(longitude)
+    except ValueError:
+        return None
+    if not (math.isfinite(lat) and math.isfinite(lng) and -90 <= lat <= 90 and -180 <= lng <= 180):
+        return None
+    return lat, lng
+
+
+def read_points(stream: Iterable[str], skip: int = 0) -> Iterator[Point]:
+    """Read points from CSV lines
+
+    Args:
+        stream: CSV lines (with header)
+        skip: Number of leading data rows to skip (for resuming)
+
+    Yields:
+        (seq, id, latitude, longitude) tuples; seq is the 0-based data row number.
+        Rows that are too short or have invalid coordinates are yielded with
+        None coordinates (reported as errors by export)
+
+    Raises:
+        ValueError: If the header has no latitude/longitude columns
+    """
+    reader = csv.reader(stream)
+    header = [name.strip().lower() for name in next(reader, [])]
+
+    lat_index = next((header.index(c) for c in LATITUDE_COLUMNS if c in header), None)
+    lng_index = next((header.index(c) for c in LONGITUDE_COLUMNS if c in header), None)
+    if lat_index is None or lng_index is None:
+        raise ValueError("Input CSV needs latitude and longitude columns")
+    id_index = header.index('id') if 'id' in header else None
+
+    for seq, row in enumerate(reader):
+        if seq < skip or not row:
+            continue
+        point_id = row[id_index] if id_index is not None and id_index < len(row) else str(seq)
+        coordinates = None
+        if lat_index < len(row) and lng_index < len(row):
+            coordinates = parse_coordinates(row[lat_index], row[lng_index])
+        if coordinates is None:
+            yield seq, point_id, None, None
+        else:
+            yield (seq, point_id) + coordinates
+
+
+def windows(points: Iterator[Point], size: int) -> Iterator[List[Point]]:
+    """Group points into fixed-size windows"""
+    window: List[Point] = []
+    for point in points:
+        window.append(point)
+        if len(window) >= size:
+            yield window
+            window = []
+    if window:
+        yield window
+
+
+class CsvSink:
+    """Write one CSV row per point and forecast hour"""
+
+    def __init__(self, path: str, append: bool):
+        self._file = open(path, 'a' if append else 'w', newline='', encoding='utf-8')
+        self._writer = csv.writer(self._file)
+        if not append or self._file.tell() == 0:
+            self._writer.writerow(CSV_COLUMNS)
+
+    def write(self, point: Point, cell: GridCell, forecast: Forecast) -> None:
+        seq, point_id, latitude, longitude = point
+        prefix = (seq, point_id, latitude, longitude, cell.latitude, cell.longitude, forecast.grib2file_time)
+        self._writer.writerows(
+            prefix + (item.datetime,) + tuple(getattr(item, name) for name in BINARY_FIELDS)
+            for item in forecast.data
+        )
+
+    def write_error(self, point: Point, error: str) -> None:
+        pass  # CSV has no place for errors; they are counted in the progress output
+
+    def commit(self) -> int:
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        return self._file.tell()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class NdjsonSink:
+    """Write one JSON object per point"""
+
+    def __init__(self, path: str, append: bool):
+        self._file = open(path, 'a' if append else 'w', encoding='utf-8')
+
+    def write(self, point: Point, cell: GridCell, forecast: Forecast) -> None:
+        seq, point_id, latitude, longitude = point
+        self._file.write(json_codec.dumps({
+            'seq': seq,
+            'id': point_id,
+            'latitude': latitude,
+            'longitude': longitude,
+            'grid_latitude': cell.latitude,
+            'grid_longitude': cell.longitude,
+            'grib2file_time': forecast.grib2file_time,
+            'forecast': forecast.to_dicts(),
+        }) + '\n')
+
+    def write_error(self, point: Point, error: str) -> None:
+        seq, point_id, latitude, longitude = point
+        self._file.write(json_codec.dumps({
+            'seq': seq, 'id': point_id, 'latitude': latitude, 'longitude': longitude, 'error': error
+        }) + '\n')
+
+    def commit(self) -> int:
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        return self._file.tell()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class ParquetSink:
+    """Write one Parquet row group per window (requires pyarrow)"""
+
+    def __init__(self, path: str, append: bool):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise SystemExit("Parquet output requires pyarrow (pip install pyarrow)")
+        if append:
+            raise SystemExit("Parquet output cannot be resumed; use CSV or NDJSON for resumable runs")
+
+        self._pa = pyarrow
+        self._schema = pyarrow.schema(
+            [('seq', pyarrow.int64()), ('id', pyarrow.string()),
+             ('latitude', pyarrow.float64()), ('longitude', pyarrow.float64()),
+             ('grid_latitude', pyarrow.float64()), ('grid_longitude', pyarrow.float64()),
+             ('grib2file_time', pyarrow.string()), ('datetime', pyarrow.string())]
+            + [(name, pyarrow.float32()) for name in BINARY_FIELDS]
+        )
+        self._writer = pyarrow.parquet.ParquetWriter(path, self._schema)
+        self._rows: Dict[str, list] = {name: [] for name in self._schema.names}
+
+    def write(self, point: Point, cell: GridCell, forecast: Forecast) -> None:
+        seq, point_id, latitude, longitude = point
+        hours = len(forecast)
+        for name, value in (('seq', seq), ('id', point_id), ('latitude', latitude),
+                            ('longitude', longitude), ('grid_latitude', cell.latitude),
+                            ('grid_longitude', cell.longitude),
+                            ('grib2file_time', forecast.grib2file_time)):
+            self._rows[name].extend([value] * hours)
+        self._rows['datetime'].extend(item.datetime for item in forecast.data)
+        for name in BINARY_FIELDS:
+            self._rows[name].extend(getattr(item, name) for item in forecast.data)
+
+    def write_error(self, point: Point, error: str) -> None:
+        pass
+
+    def commit(self) -> int:
+        if self._rows['seq']:
+            self._writer.write_table(self._pa.table(self._rows, schema=self._schema))
+            self._rows = {name: [] for name in self._schema.names}
+        return 0
+
+    def close(self) -> None:
+        self.commit()
+        self._writer.close()
+
+
+SINKS = {'csv': CsvSink, 'ndjson': NdjsonSink, 'parquet': ParquetSink}
+
+
+class Progress:
+    """Periodic progress/throughput readout on stderr"""
+
+    def __init__(self, interval: float, stream=sys.stderr):
+        self.interval = interval
+        self.stream = stream
+        self.points = 0
+        self.fetched = 0
+        self.errors = 0
+        self._started = time.monotonic()
+        self._last_report = self._started
+
+    def update(self, points: int = 0, fetched: int = 0, errors: int = 0) -> None:
+        self.points += points
+        self.fetched += fetched
+        self.errors += errors
+
+        now = time.monotonic()
+        if now - self._last_report >= self.interval:
+            self._last_report = now
+            self.report()
+
+    def report(self, final: bool = False) -> None:
+        elapsed = max(time.monotonic() - self._started, 1e-9)
+        saved = 1 - self.fetched / self.points if self.points else 0.0
+        self.stream.write(
+            f"{'done' if final else 'progress'}: {self.points} points "
+            f"({self.points / elapsed:.1f}/s), {self.fetched} upstream fetches "
+            f"({saved:.0%} deduplicated), {self.errors} errors, {elapsed:.0f}s elapsed\n"
+        )
+        self.stream.flush()
+
+
+def load_checkpoint(path: str) -> Optional[dict]:
+    """Load a checkpoint file if it exists"""
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_checkpoint(path: str, state: dict) -> None:
+    """Atomically write a checkpoint file"""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
+
+
+def export(client: WeatherForecastClient, points: Iterator[Point], sink, hours: int,
+           workers: int, window_size: int, cell_cache_size: int, progress: Progress,
+           on_commit=None) -> None:
+    """Fetch forecasts for a stream of points and write them to a sink in input order
+
+    Points are processed in windows. Within a window each grid cell is
+    fetched once; recently fetched cells are kept in a bounded LRU so
+    sorted or clustered inputs also avoid refetching across windows.
+
+    Args:
+        client: API client
+        points: Input points
+        sink: Output sink
+        hours: Forecast hours per point
+        workers: Number of concurrent upstream requests
+        window_size: Points buffered per window
+        cell_cache_size: Forecasts kept for reuse across windows
+        progress: Progress reporter
+        on_commit: Called with (next seq, output offset) after each window is flushed
+    """
+    recent: 'OrderedDict[GridCell, Future]' = OrderedDict()
+
+    def fetch(cell: GridCell) -> Forecast:
+        return client.get_forecast(cell.latitude, cell.longitude, hours, priority=PRIORITY_BULK)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for window in windows(points, window_size):
+            futures: Dict[GridCell, Future] = {}
+            fetched = 0
+            for _, _, latitude, longitude in window:
+                if latitude is None:
+                    continue
+                cell = grid_cell(latitude, longitude)
+                if cell in futures:
+                    continue
+                if cell in recent:
+                    recent.move_to_end(cell)
+                    futures[cell] = recent[cell]
+                else:
+                    futures[cell] = executor.submit(fetch, cell)
+                    fetched += 1
+
+            errors = 0
+            for point in window:
+                if point[2] is None:
+                    sink.write_error(point, INVALID_POINT_ERROR)
+                    errors += 1
+                    continue
+                cell = grid_cell(point[2], point[3])
+                try:
+                    sink.write(point, cell, futures[cell].result())
+                except WeatherAPIError as e:
+                    sink.write_error(point, str(e))
+                    errors += 1
+
+            for cell, future in futures.items():
+                if future.exception() is None:
+                    recent[cell] = future
+                    recent.move_to_end(cell)
+            while len(recent) > cell_cache_size:
+                recent.popitem(last=False)
+
+            offset = sink.commit()
+            if on_commit:
+                on_commit(window[-1][0] + 1, offset)
+            progress.update(points=len(window), fetched=fetched, errors=errors)
+
+
+def parse_shard(text: str) -> ShardSpec:
+    """argparse type for --shard"""
+    try:
+        return ShardSpec.parse(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Export forecasts for a CSV list of points')
+    parser.add_argument('input', nargs='+',
+                        help="Input CSV with latitude/longitude columns ('-' for stdin), "
+                             "or the per-shard outputs with --merge")
+    parser.add_argument('-o', '--output', required=True, help='Output file')
+    parser.add_argument('--format', choices=sorted(SINKS),
+                        help='Output format (default: from the output file extension)')
+    parser.add_argument('--token', default=os.getenv('WEATHER_API_TOKEN', 'api_sample'),
+                        help='API token (default: $WEATHER_API_TOKEN)')
+    parser.add_argument('--hours', type=int, default=24, help='Forecast hours per point (default: 24)')
+    parser.add_argument('--workers', type=int, default=8, help='Concurrent upstream requests (default: 8)')
+    parser.add_argument('--retries', type=int, default=2,
+                        help='Retries per request on timeouts, connection errors, 429 and 5xx (default: 2)')
+    parser.add_argument('--window', type=int, default=1000, help='Points buffered per window (default: 1000)')
+    parser.add_argument('--cell-cache', type=int, default=1024,
+                        help='Recently fetched grid cells kept for reuse (default: 1024)')
+    parser.add_argument('--checkpoint', help='Checkpoint file (default: <output>.ckpt)')
+    parser.add_argument('--resume', action='store_true', help='Resume from the checkpoint')
+    parser.add_argument('--shard', type=parse_shard,
+                        help='Export only the grid cells of shard INDEX/COUNT (0-based, e.g. 0/4)')
+    parser.add_argument('--merge', action='store_true',
+                        help='Merge per-shard outputs into the output file in input order')
+    parser.add_argument('--progress-interval', type=float, default=5.0,
+                        help='Seconds between progress lines (default: 5)')
+    args = parser.parse_args(argv)
+
+    output_format = args.format or os.path.splitext(args.output)[1].lstrip('.').lower()
+    if output_format not in SINKS:
+        parser.error('Cannot infer the output format; use --format')
+
+    if args.merge:
+        if args.shard or args.resume:
+            parser.error('--merge cannot be combined with --shard or --resume')
+        try:
+            rows = merge_outputs(args.input, args.output, output_format)
+        except ValueError as e:
+            parser.error(str(e))
+        print(f"merged {len(args.input)} shards: {rows} rows", file=sys.stderr)
+        return 0
+    if len(args.input) != 1:
+        parser.error('Only one input file can be exported (use --merge to combine shard outputs)')
+    input_path = args.input[0]
+    shard = str(args.shard) if args.shard else None
+
+    checkpoint_path = args.checkpoint or args.output + '.ckpt'
+    skip = 0
+    if args.resume:
+        state = load_checkpoint(checkpoint_path)
+        if state is not None:
+            if state.get('shard') != shard:
+                parser.error(f"Checkpoint was written for shard {state.get('shard') or '(none)'}")
+            try:
+                output_size = os.path.getsize(args.output)
+            except OSError:
+                output_size = None
+            if output_size is None or output_size < state['output_offset']:
+                parser.error(f"Cannot resume: {args.output} is missing or shorter than the checkpoint "
+                             f"({state['output_offset']} bytes); remove {checkpoint_path} to start over")
+            skip = state['next_seq']
+            # Drop anything written after the last checkpoint
+            with open(args.output, 'r+b') as f:
+                f.truncate(state['output_offset'])
+            print(f"resuming at row {skip}", file=sys.stderr)
+
+    def on_commit(next_seq: int, offset: int) -> None:
+        if output_format != 'parquet':
+            save_checkpoint(checkpoint_path, {'next_seq': next_seq, 'output_offset': offset, 'shard': shard})
+
+    client = WeatherForecastClient(args.token, max_retries=args.retries)
+    sink = SINKS[output_format](args.output, append=skip > 0)
+    progress = Progress(args.progress_interval)
+
+    stream = sys.stdin if input_path == '-' else open(input_path, newline='', encoding='utf-8')
+    points = read_points(stream, skip)
+    if args.shard:
+        # seq stays the global row number so shard outputs can be merged in input order
+        points = shard_points(points, args.shard)
+        print(f"exporting shard {shard}", file=sys.stderr)
+    try:
+        export(client, points, sink, args.hours, args.workers,
+               args.window, args.cell_cache, progress, on_commit)
+    finally:
+        sink.close()
+        if stream is not sys.stdin:
+            stream.close()
+
+    progress.report(final=True)
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,205 @@
+"""
+Run-to-run forecast diffing
+
+Compares forecasts of the same sites (or grid cells) from two model runs
+over the hours both runs cover, and reports the variables whose change
+exceeds a tolerance. Downstream consumers can then recompute only the
+sites that materially changed.
+
+Usage:
+    from diff import diff_forecasts, diff_many
+
+    d = diff_forecasts(previous, current)
+    if d.changed:
+        print(d.changed_variables())
+
+    diffs = diff_many(previous_by_cell, current_by_cell)
+    changed_cells = [cell for cell, d in diffs.items() if d.changed]
+"""
+
+import operator
+from dataclasses import dataclass, field, replace
+from typing import Dict, Hashable, Iterable, List, Mapping, Optional, Tuple, Union
+
+try:
+    from .weather_forecast_client import BINARY_FIELDS, Forecast
+except ImportError:
+    from weather_forecast_client import BINARY_FIELDS, Forecast
+
+
+# Changes at or below these absolute values are not material
+DEFAULT_TOLERANCES: Dict[str, float] = {
+    'temperature': 1.0,      # °C
+    'precipitation': 1.0,    # mm
+    'wind_speed': 2.0,       # m/s
+    'wind_direction': 45.0,  # degrees (compared around the circle)
+    'humidity': 10.0,        # %
+    'cloud_cover': 20.0,     # %
+    'pressure': 2.0,         # hPa
+}
+
+_CIRCULAR = frozenset(('wind_direction',))
+
+
+@dataclass(frozen=True)
+class VariableChange:
+    """Material change of one variable between two runs"""
+
+    variable: str
+    max_change: float    # largest absolute change over the compared hours
+    datetime: str        # hour of the largest change
+    hours_changed: int   # hours whose change exceeds the tolerance
+
+
+@dataclass
+class ForecastDiff:
+    """Difference between two forecasts of the same site
+
+    Attributes:
+        site: Site identifier
+        old_run: grib2file_time of the previous forecast (None if the site is new)
+        new_run: grib2file_time of the current forecast
+        old_start: Index of the first compared hour in the previous forecast
+        new_start: Index of the first compared hour in the current forecast
+        hours: Number of hours both forecasts cover
+        added_hours: Hours of the current forecast after the compared range
+        changes: Variables whose change exceeds the tolerance
+    """
+
+    site: Hashable
+    old_run: Optional[str]
+    new_run: str
+    old_start: int = 0
+    new_start: int = 0
+    hours: int = 0
+    added_hours: int = 0
+    changes: Dict[str, VariableChange] = field(default_factory=dict)
+
+    @property
+    def changed(self) -> bool:
+        """True if any variable changed materially or nothing could be compared"""
+        return bool(self.changes) or self.hours == 0
+
+    def changed_variables(self) -> List[str]:
+        """Names of the variables that changed materially"""
+        return list(self.changes)
+
+
+def align(old: Forecast, new: Forecast) -> Tuple[int, int, int]:
+    """Find the hours two forecasts have in common
+
+    Args:
+        old: Previous forecast
+        new: Current forecast
+
+    Returns:
+        (index in old, index in new, number of hours); hours is 0 when the
+        forecasts do not overlap
+    """
+    old_times = old.column('datetime')
+    new_times = new.column('datetime')
+    if not old_times or not new_times:
+        return 0, 0, 0
+
+    if new_times[0] >= old_times[0]:
+        try:
+            old_start, new_start = old_times.index(new_times[0]), 0
+        except ValueError:
+            return 0, 0, 0
+    else:
+        try:
+            old_start, new_start = 0, new_times.index(old_times[0])
+        except ValueError:
+            return 0, 0, 0
+
+    hours = min(len(old_times) - old_start, len(new_times) - new_start)
+    # Both series are hourly; anything else is not compared
+    if old_times[old_start + hours - 1] != new_times[new_start + hours - 1]:
+        return 0, 0, 0
+    return old_start, new_start, hours
+
+
+def _values(forecast: Forecast, variable: str):
+    if variable in BINARY_FIELDS:
+        return forecast.column(variable)
+    return forecast.derived(variable)
+
+
+def diff_forecasts(old: Optional[Forecast], new: Forecast,
+                   tolerances: Optional[Mapping[str, float]] = None,
+                   site: Hashable = None) -> ForecastDiff:
+    """Compare two forecasts of the same site
+
+    Each variable is compared in one pass over the common hours.
+
+    Args:
+        old: Previous forecast (None if the site has none)
+        new: Current forecast
+        tolerances: Variable -> largest change that is not material
+            (default: DEFAULT_TOLERANCES). Derived variables may be used
+        site: Site identifier stored in the result
+
+    Returns:
+        ForecastDiff
+    """
+    if old is None:
+        return ForecastDiff(site, None, new.grib2file_time, added_hours=len(new))
+
+    tolerances = DEFAULT_TOLERANCES if tolerances is None else tolerances
+    old_start, new_start, hours = align(old, new)
+    result = ForecastDiff(
+        site, old.grib2file_time, new.grib2file_time, old_start, new_start, hours,
+        max(0, len(new) - new_start - hours) if hours else len(new)
+    )
+    if hours == 0:
+        return result
+
+    times = new.column('datetime')
+    for variable, tolerance in tolerances.items():
+        before = _values(old, variable)[old_start:old_start + hours]
+        after = _values(new, variable)[new_start:new_start + hours]
+        if variable in _CIRCULAR:
+            deltas = [abs((b - a + 180) % 360 - 180) for a, b in zip(before, after)]
+        else:
+            deltas = list(map(abs, map(operator.sub, after, before)))
+
+        largest = max(deltas)
+        if largest <= tolerance:
+            continue
+
+        index = deltas.index(largest)
+        result.changes[variable] = VariableChange(
+            variable, largest, times[new_start + index], sum(d > tolerance for d in deltas)
+        )
+    return result
+
+
+def diff_many(old: Mapping[Hashable, Forecast],
+              new: Union[Mapping[Hashable, Forecast], Iterable[Tuple[Hashable, Forecast]]],
+              tolerances: Optional[Mapping[str, float]] = None) -> Dict[Hashable, ForecastDiff]:
+    """Compare the forecasts of many sites across two runs
+
+    Sites that share the same pair of Forecast objects (e.g. points in one
+    grid cell served from a cache) are compared once.
+
+    Args:
+        old: Site -> previous forecast
+        new: Site -> current forecast (mapping or iterable of pairs)
+        tolerances: See diff_forecasts()
+
+    Returns:
+        dict: Site -> ForecastDiff for every site in new
+    """
+    items = new.items() if isinstance(new, Mapping) else new
+    compared: Dict[Tuple[int, int], ForecastDiff] = {}
+    keep = []
+    result = {}
+    for site, forecast in items:
+        previous = old.get(site)
+        key = (id(previous), id(forecast))
+        diff = compared.get(key)
+        if diff is None:
+            diff = compared[key] = diff_forecasts(previous, forecast, tolerances, site)
+            keep.append((previous, forecast))  # keep ids valid while comparing
+        result[site] = diff if diff.site == site else replace(diff, site=site)
+    return result
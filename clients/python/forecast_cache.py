@@ -0,0 +1,354 @@
+"""
+Cross-process forecast cache backed by a memory-mapped file
+
+Every process on the host that opens the same cache file shares one copy
+of each forecast, so concurrent MCP servers and workers make a single
+upstream request per grid cell and model run.
+
+MemoryForecastCache offers the same interface for a single process.
+
+Usage:
+    from forecast_cache import SharedForecastCache
+    from weather_forecast_client import WeatherForecastClient
+
+    cache = SharedForecastCache('/tmp/weather-forecast-cache.bin')
+    client = WeatherForecastClient('your_api_token', cache=cache)
+
+Protocol:
+    - Readers never take locks. Each slot carries a sequence counter
+      (seqlock): a writer makes it odd before writing and even afterwards,
+      and readers retry when the counter changed or is odd. A CRC32 of the
+      payload guards against torn reads.
+    - Writers are serialized per set of slots with a threading lock plus an
+      fcntl byte-range lock on a companion ``.lock`` file, so only one
+      process refreshes a grid cell at a time. Other processes keep serving
+      the stale entry (or wait for the refresh when there is none).
+"""
+
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: locking falls back to this process only
+    fcntl = None
+
+try:
+    from .grid import GridCell
+    from .weather_forecast_client import Forecast
+except ImportError:
+    from grid import GridCell
+    from weather_forecast_client import Forecast
+
+
+DEFAULT_CACHE_PATH = os.path.join(tempfile.gettempdir(), 'weather-forecast-cache.bin')
+
+
+def resolve_cache_path(setting: Optional[str]) -> Optional[str]:
+    """Resolve a cache setting such as WEATHER_FORECAST_CACHE
+
+    Args:
+        setting: File path, 'on' (DEFAULT_CACHE_PATH) or 'off'/empty (disabled);
+            'on' and 'off' are case-insensitive
+
+    Returns:
+        Cache file path, or None when the cache is disabled
+    """
+    setting = (setting or '').strip()
+    if not setting or setting.lower() == 'off':
+        return None
+    if setting.lower() == 'on':
+        return DEFAULT_CACHE_PATH
+    return setting
+
+# magic, version, sets, ways, slot size
+_FILE_HEADER = struct.Struct('<4sHxxIII')
+_FILE_HEADER_SIZE = 64
+_FILE_MAGIC = b'WFSC'
+_FILE_VERSION = 1
+
+# sequence, row, col, crc32, stored at (epoch seconds), payload length
+_SLOT_HEADER = struct.Struct('<QiiIdI')
+_SEQUENCE = struct.Struct('<Q')
+
+_READ_RETRIES = 64
+
+# Fits a 172-hour forecast whose columns all fall back to float64 (about 10.4KB)
+DEFAULT_SLOT_SIZE = 12 * 1024
+
+
+class MemoryForecastCache:
+    """Forecast cache local to this process (same interface as SharedForecastCache)"""
+
+    def __init__(self, max_entries: int = 4096, ttl: float = 600.0):
+        """Create an in-memory cache
+
+        Args:
+            max_entries: Number of grid cells kept (least recently used are evicted)
+            ttl: Seconds after which an entry is refreshed from upstream
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: 'OrderedDict[Tuple[int, int], Tuple[Forecast, float]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, cell: GridCell, grib2file_time: Optional[str] = None,
+            max_age: Optional[float] = None) -> Optional[Forecast]:
+        """Get a cached forecast (see SharedForecastCache.get)"""
+        with self._lock:
+            entry = self._entries.get((cell.row, cell.col))
+            if entry is None:
+                return None
+            self._entries.move_to_end((cell.row, cell.col))
+
+        forecast, stored_at = entry
+        if time.time() - stored_at > (self.ttl if max_age is None else max_age):
+            return None
+        if grib2file_time is not None and forecast.grib2file_time != grib2file_time:
+            return None
+        return forecast
+
+    def put(self, cell: GridCell, forecast: Forecast) -> bool:
+        """Store a forecast"""
+        with self._lock:
+            self._entries[(cell.row, cell.col)] = (forecast, time.time())
+            self._entries.move_to_end((cell.row, cell.col))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return True
+
+    def get_or_fetch(self, cell: GridCell, fetch: Callable[[], Forecast]) -> Forecast:
+        """Get a fresh forecast, fetching it when missing or stale"""
+        forecast = self.get(cell)
+        if forecast is None:
+            forecast = fetch()
+            self.put(cell, forecast)
+        return forecast
+
+
+class SharedForecastCache:
+    """Forecast cache shared between processes through a memory-mapped file"""
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, sets: int = 512, ways: int = 4,
+                 slot_size: int = DEFAULT_SLOT_SIZE, ttl: float = 600.0):
+        """Open (or create) a shared cache file
+
+        Args:
+            path: Cache file path. Processes using the same path share entries
+            sets: Number of slot sets (a grid cell always maps to the same set)
+            ways: Slots per set
+            slot_size: Bytes per slot (a 172-hour forecast needs 5.6KB to 10.4KB
+                depending on how many columns fall back to float64)
+            ttl: Seconds after which an entry is refreshed from upstream
+
+        Raises:
+            ValueError: If an existing file was created with a different layout
+        """
+        self.path = path
+        self.ttl = ttl
+        self._lock_fd = os.open(path + '.lock', os.O_RDWR | os.O_CREAT, 0o644)
+        self._set_locks = [threading.Lock() for _ in range(sets)]
+
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            with self._file_lock(0):
+                size = _FILE_HEADER_SIZE + sets * ways * slot_size
+                if os.fstat(fd).st_size == 0:
+                    os.ftruncate(fd, size)
+                    os.write(fd, _FILE_HEADER.pack(_FILE_MAGIC, _FILE_VERSION, sets, ways, slot_size))
+                    os.lseek(fd, 0, os.SEEK_SET)
+
+                header = _FILE_HEADER.unpack(os.read(fd, _FILE_HEADER.size))
+                if header != (_FILE_MAGIC, _FILE_VERSION, sets, ways, slot_size):
+                    raise ValueError(f"Cache file {path} has an incompatible layout")
+
+            self._mm = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+
+        self.sets = sets
+        self.ways = ways
+        self.slot_size = slot_size
+        # Fetched forecasts that could not be stored (too large for a slot)
+        self.uncached = 0
+
+    def close(self) -> None:
+        """Unmap the cache file"""
+        self._mm.close()
+        os.close(self._lock_fd)
+
+    def get(self, cell: GridCell, grib2file_time: Optional[str] = None,
+            max_age: Optional[float] = None) -> Optional[Forecast]:
+        """Get a cached forecast without locking
+
+        Args:
+            cell: Grid cell
+            grib2file_time: Only return the entry for this model run
+            max_age: Maximum entry age in seconds (default: ttl)
+
+        Returns:
+            Forecast or None if missing or stale
+        """
+        entry = self._lookup(cell)
+        if entry is None:
+            return None
+
+        forecast, stored_at = entry
+        if time.time() - stored_at > (self.ttl if max_age is None else max_age):
+            return None
+        if grib2file_time is not None and forecast.grib2file_time != grib2file_time:
+            return None
+        return forecast
+
+    def put(self, cell: GridCell, forecast: Forecast) -> bool:
+        """Store a forecast
+
+        Args:
+            cell: Grid cell
+            forecast: Forecast to store
+
+        Returns:
+            bool: False if the forecast does not fit in a slot
+        """
+        payload = forecast.to_bytes()
+        with self._write_lock(self._set_index(cell), blocking=True):
+            return self._write(cell, payload)
+
+    def get_or_fetch(self, cell: GridCell, fetch: Callable[[], Forecast]) -> Forecast:
+        """Get a fresh forecast, refreshing it from upstream at most once across processes
+
+        When the entry is stale and another process is already refreshing
+        it, the stale entry is returned instead of waiting. Forecasts that
+        cannot be stored are returned uncached and counted in ``uncached``.
+
+        Args:
+            cell: Grid cell
+            fetch: Callable returning a fresh Forecast for the cell
+
+        Returns:
+            Forecast object
+        """
+        entry = self._lookup(cell)
+        if entry is not None and time.time() - entry[1] <= self.ttl:
+            return entry[0]
+
+        set_index = self._set_index(cell)
+        with self._write_lock(set_index, blocking=entry is None) as acquired:
+            if not acquired:
+                return entry[0]
+
+            # Another process may have finished a refresh while we waited
+            refreshed = self._lookup(cell)
+            if refreshed is not None and time.time() - refreshed[1] <= self.ttl:
+                return refreshed[0]
+
+            forecast = fetch()
+            try:
+                stored = self._write(cell, forecast.to_bytes())
+            except ValueError:
+                stored = False  # not serializable (unexpected datetime format)
+            if not stored:
+                self.uncached += 1
+            return forecast
+
+    def _set_index(self, cell: GridCell) -> int:
+        return ((cell.row * 73856093) ^ (cell.col * 19349663)) % self.sets
+
+    def _slot_offset(self, set_index: int, way: int) -> int:
+        return _FILE_HEADER_SIZE + (set_index * self.ways + way) * self.slot_size
+
+    def _lookup(self, cell: GridCell) -> Optional[Tuple[Forecast, float]]:
+        set_index = self._set_index(cell)
+        for way in range(self.ways):
+            entry = self._read_slot(self._slot_offset(set_index, way), cell)
+            if entry is not None:
+                payload, stored_at = entry
+                try:
+                    return Forecast.from_bytes(payload), stored_at
+                except ValueError:
+                    return None  # written by an older payload version; refetched and overwritten
+        return None
+
+    def _read_slot(self, offset: int, cell: GridCell) -> Optional[Tuple[bytes, float]]:
+        mm = self._mm
+        for _ in range(_READ_RETRIES):
+            sequence, row, col, crc, stored_at, length = _SLOT_HEADER.unpack_from(mm, offset)
+            if sequence & 1:
+                time.sleep(0)
+                continue
+            if length == 0 or row != cell.row or col != cell.col:
+                return None
+
+            start = offset + _SLOT_HEADER.size
+            payload = mm[start:start + length]
+
+            if _SEQUENCE.unpack_from(mm, offset)[0] != sequence or zlib.crc32(payload) != crc:
+                continue
+            return payload, stored_at
+        return None
+
+    def _write(self, cell: GridCell, payload: bytes) -> bool:
+        if _SLOT_HEADER.size + len(payload) > self.slot_size:
+            return False
+
+        # Prefer the slot already holding this cell, then an empty slot, then the oldest one
+        set_index = self._set_index(cell)
+        candidates = []
+        for way in range(self.ways):
+            offset = self._slot_offset(set_index, way)
+            _, row, col, _, stored_at, length = _SLOT_HEADER.unpack_from(self._mm, offset)
+            if length and row == cell.row and col == cell.col:
+                candidates = [(-2.0, offset)]
+                break
+            candidates.append((stored_at if length else -1.0, offset))
+        offset = min(candidates)[1]
+
+        sequence = _SEQUENCE.unpack_from(self._mm, offset)[0]
+        _SEQUENCE.pack_into(self._mm, offset, sequence + 1)
+        self._mm[offset + _SLOT_HEADER.size:offset + _SLOT_HEADER.size + len(payload)] = payload
+        _SLOT_HEADER.pack_into(
+            self._mm, offset, sequence + 1, cell.row, cell.col,
+            zlib.crc32(payload), time.time(), len(payload)
+        )
+        _SEQUENCE.pack_into(self._mm, offset, sequence + 2)
+        return True
+
+    @contextmanager
+    def _write_lock(self, set_index: int, blocking: bool) -> Iterator[bool]:
+        thread_lock = self._set_locks[set_index]
+        if not thread_lock.acquire(blocking):
+            yield False
+            return
+
+        try:
+            # Byte 0 of the lock file guards initialization; set N uses byte N + 1
+            with self._file_lock(set_index + 1, blocking) as acquired:
+                yield acquired
+        finally:
+            thread_lock.release()
+
+    @contextmanager
+    def _file_lock(self, position: int, blocking: bool = True) -> Iterator[bool]:
+        if fcntl is None:
+            yield True
+            return
+
+        flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+        try:
+            fcntl.lockf(self._lock_fd, flags, 1, position)
+        except OSError:
+            yield False
+            return
+
+        try:
+            yield True
+        finally:
+            fcntl.lockf(self._lock_fd, fcntl.LOCK_UN, 1, position)
@@ -0,0 +1,81 @@
+"""
+GSM grid helpers
+
+Upstream forecasts come from the JMA GSM model, so every coordinate inside
+the same grid cell receives the same forecast. Snapping coordinates to a
+grid cell lets callers share cached results and avoid duplicate requests.
+
+Usage:
+    from grid import grid_cell
+
+    cell = grid_cell(35.6762, 139.6503)
+    print(cell.latitude, cell.longitude)
+"""
+
+from dataclasses import dataclass
+
+
+# GSM Japan-area grid spacing (degrees)
+GRID_LAT_STEP = 0.1
+GRID_LNG_STEP = 0.125
+
+
+@dataclass(frozen=True)
+class GridCell:
+    """Grid cell identified by integer row/column indices"""
+
+    row: int
+    col: int
+    lat_step: float = GRID_LAT_STEP
+    lng_step: float = GRID_LNG_STEP
+
+    @property
+    def latitude(self) -> float:
+        """Latitude of the grid point"""
+        return round(self.row * self.lat_step, 6)
+
+    @property
+    def longitude(self) -> float:
+        """Longitude of the grid point"""
+        return round(self.col * self.lng_step, 6)
+
+    def key(self) -> str:
+        """Get a stable string key for the cell
+
+        Returns:
+            str: Key such as "356,1117"
+        """
+        return f"{self.row},{self.col}"
+
+    def offset(self, d_row: int, d_col: int) -> 'GridCell':
+        """Get a neighbouring cell
+
+        Args:
+            d_row: Row offset
+            d_col: Column offset
+
+        Returns:
+            GridCell at the given offset
+        """
+        return GridCell(self.row + d_row, self.col + d_col, self.lat_step, self.lng_step)
+
+
+def grid_cell(latitude: float, longitude: float,
+              lat_step: float = GRID_LAT_STEP, lng_step: float = GRID_LNG_STEP) -> GridCell:
+    """Snap a coordinate to its nearest grid point
+
+    Args:
+        latitude: Latitude of the location
+        longitude: Longitude of the location
+        lat_step: Grid spacing in latitude (degrees)
+        lng_step: Grid spacing in longitude (degrees)
+
+    Returns:
+        GridCell containing the coordinate
+    """
+    return GridCell(
+        int(round(latitude / lat_step)),
+        int(round(longitude / lng_step)),
+        lat_step,
+        lng_step
+    )
@@ -0,0 +1,161 @@
+"""
+Spatial interpolation of forecasts from cached grid cells
+
+Answers arbitrary coordinates from the forecasts already cached for the
+surrounding grid points instead of making a new upstream request. Each
+variable is interpolated for the whole series in one pass with a single
+set of weights; wind is interpolated as u/v components so directions
+around north blend correctly.
+
+Usage:
+    from forecast_cache import MemoryForecastCache
+    from interpolation import InterpolationPolicy
+    from weather_forecast_client import WeatherForecastClient
+
+    client = WeatherForecastClient('your_api_token', cache=MemoryForecastCache())
+    forecast = client.get_interpolated_forecast(35.6762, 139.6503, 24,
+                                                policy=InterpolationPolicy(min_neighbors=3))
+"""
+
+import math
+from collections import Counter
+from dataclasses import dataclass
+from typing import List, Optional, Sequence, Tuple
+
+try:
+    from .grid import GRID_LAT_STEP, GRID_LNG_STEP, GridCell
+    from .weather_forecast_client import BINARY_FIELDS, Forecast, ForecastItem
+except ImportError:
+    from grid import GRID_LAT_STEP, GRID_LNG_STEP, GridCell
+    from weather_forecast_client import BINARY_FIELDS, Forecast, ForecastItem
+
+
+# Variables blended directly; wind direction is derived from u/v instead
+_SCALAR_FIELDS = tuple(name for name in BINARY_FIELDS if name != 'wind_direction')
+
+
+@dataclass
+class InterpolationPolicy:
+    """Accuracy/latency trade-off for interpolated forecasts
+
+    Attributes:
+        method: 'bilinear' (corner weights) or 'idw' (inverse distance)
+        min_neighbors: Cached surrounding grid points (1-4) required to
+            interpolate; with fewer, a real fetch is made
+        snap_distance: When the point lies within this fraction of a grid
+            spacing of a cached grid point, that forecast is used as is
+        max_age: Maximum age of cached forecasts in seconds (default: cache ttl)
+        idw_power: Distance exponent for 'idw'
+    """
+
+    method: str = 'bilinear'
+    min_neighbors: int = 4
+    snap_distance: float = 0.05
+    max_age: Optional[float] = None
+    idw_power: float = 2.0
+
+
+def surrounding_cells(latitude: float, longitude: float, lat_step: float = GRID_LAT_STEP,
+                      lng_step: float = GRID_LNG_STEP) -> List[Tuple[GridCell, float, float]]:
+    """Get the four grid points around a coordinate
+
+    Args:
+        latitude: Latitude of the location
+        longitude: Longitude of the location
+        lat_step: Grid spacing in latitude (degrees)
+        lng_step: Grid spacing in longitude (degrees)
+
+    Returns:
+        List of (cell, bilinear weight, distance in grid units)
+    """
+    row = latitude / lat_step
+    col = longitude / lng_step
+    row0, col0 = math.floor(row), math.floor(col)
+    fr, fc = row - row0, col - col0
+
+    corners = []
+    for d_row, w_row in ((0, 1 - fr), (1, fr)):
+        for d_col, w_col in ((0, 1 - fc), (1, fc)):
+            distance = math.hypot(fr - d_row, fc - d_col)
+            corners.append((GridCell(row0 + d_row, col0 + d_col, lat_step, lng_step), w_row * w_col, distance))
+    return corners
+
+
+def blend(latitude: float, longitude: float, forecasts: Sequence[Forecast],
+          weights: Sequence[float]) -> Forecast:
+    """Blend forecasts of the same model run with normalized weights
+
+    Args:
+        latitude: Latitude of the result
+        longitude: Longitude of the result
+        forecasts: Neighbouring forecasts (same grib2file_time)
+        weights: One weight per forecast
+
+    Returns:
+        Forecast located at (latitude, longitude)
+    """
+    total = sum(weights)
+    weights = [w / total for w in weights]
+    hours = min(len(f) for f in forecasts)
+
+    def combine(columns: List[List[float]]) -> List[float]:
+        return [sum(w * v for w, v in zip(weights, values)) for values in zip(*columns)]
+
+    blended = {
+        name: combine([f.column(name)[:hours] for f in forecasts])
+        for name in _SCALAR_FIELDS
+    }
+
+    # Direction the wind blows from -> u/v components, blended, then back
+    u = combine([f.derived('wind_u')[:hours] for f in forecasts])
+    v = combine([f.derived('wind_v')[:hours] for f in forecasts])
+    blended['wind_direction'] = [math.degrees(math.atan2(-a, -b)) % 360 for a, b in zip(u, v)]
+
+    items = [
+        ForecastItem(item.datetime, *values)
+        for item, values in zip(forecasts[0].data, zip(*(blended[name] for name in BINARY_FIELDS)))
+    ]
+    return Forecast._from_items(latitude, longitude, forecasts[0].grib2file_time, items)
+
+
+def interpolate_from_cache(cache, latitude: float, longitude: float,
+                           policy: Optional[InterpolationPolicy] = None) -> Optional[Forecast]:
+    """Interpolate a forecast from cached neighbouring grid points
+
+    Args:
+        cache: Forecast cache (MemoryForecastCache or SharedForecastCache)
+        latitude: Latitude of the location
+        longitude: Longitude of the location
+        policy: Interpolation policy (default: InterpolationPolicy())
+
+    Returns:
+        Forecast, or None if the policy requires a real fetch
+    """
+    policy = policy or InterpolationPolicy()
+
+    neighbours = []
+    for cell, weight, distance in surrounding_cells(latitude, longitude):
+        forecast = cache.get(cell, max_age=policy.max_age)
+        if forecast is None:
+            continue
+        if distance <= policy.snap_distance:
+            return Forecast._from_items(latitude, longitude, forecast.grib2file_time, forecast.data)
+        neighbours.append((forecast, weight, distance))
+
+    # Only blend forecasts from the most common model run
+    if neighbours:
+        run, _ = Counter(f.grib2file_time for f, _, _ in neighbours).most_common(1)[0]
+        neighbours = [n for n in neighbours if n[0].grib2file_time == run]
+
+    if len(neighbours) < max(1, policy.min_neighbors):
+        return None
+
+    if policy.method == 'idw':
+        weights = [1 / distance ** policy.idw_power for _, _, distance in neighbours]
+    else:
+        weights = [weight for _, weight, _ in neighbours]
+        if sum(weights) <= 0:
+            # Only corners with zero bilinear weight are cached; fall back to distances
+            weights = [1 / distance ** policy.idw_power for _, _, distance in neighbours]
+
+    return blend(latitude, longitude, [f for f, _, _ in neighbours], weights)
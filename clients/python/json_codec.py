@@ -0,0 +1,253 @@
+"""
+Pluggable JSON codec
+
+One place for the JSON decode/encode hot paths of the client, the MCP server
+and the CORS proxy. The fastest installed backend is used:
+
+- orjson: fastest parse and encode (decodes to dicts)
+- msgspec: typed decoding of API responses straight into ForecastItem
+  structures without intermediate dicts
+- json: standard library fallback
+
+Set WEATHER_JSON_CODEC=orjson|msgspec|json to force a backend.
+
+Backends are imported on the first encode/decode, so importing this module
+does not slow down startup (e.g. of the MCP server).
+
+Usage:
+    import json_codec
+
+    forecast = json_codec.decode_forecast(response.content, hours=24)
+    text = json_codec.dumps({'temperature': 12.5}, indent=True)
+    body = json_codec.encode({'error': 'Not Found'})
+"""
+
+import functools
+import json
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    from .weather_forecast_client import Forecast, ForecastItem, WeatherAPIError
+except ImportError:
+    from weather_forecast_client import Forecast, ForecastItem, WeatherAPIError
+
+
+def _check_envelope(code: Optional[int], error: Optional[str]) -> None:
+    """Raise WeatherAPIError for error responses"""
+    if error is not None:
+        raise WeatherAPIError(error)
+    if code != 200:
+        raise WeatherAPIError(f"API Error: Code {code}")
+
+
+class JSONCodec:
+    """Standard library codec (also the base for the faster backends)"""
+
+    name = 'json'
+
+    def loads(self, data) -> Any:
+        """Decode JSON bytes or str"""
+        return json.loads(data)
+
+    def encode(self, obj: Any, indent: bool = False) -> bytes:
+        """Encode to UTF-8 JSON bytes (compact, or indented by 2 spaces)"""
+        return self.dumps(obj, indent).encode('utf-8')
+
+    def dumps(self, obj: Any, indent: bool = False) -> str:
+        """Encode to a JSON str (non-ASCII characters are kept as is)"""
+        if indent:
+            return json.dumps(obj, ensure_ascii=False, indent=2)
+        return json.dumps(obj, ensure_ascii=False, separators=(',', ':'))
+
+    def decode_forecast(self, data, hours: int = 24) -> Forecast:
+        """Decode an API response into a Forecast
+
+        Args:
+            data: Response body (bytes or str)
+            hours: Number of hours to include
+
+        Returns:
+            Forecast
+
+        Raises:
+            WeatherAPIError: If the response reports an error
+            KeyError, ValueError: If the response is malformed
+        """
+        response = self.loads(data)
+        if not isinstance(response, dict):
+            raise ValueError("Response is not a JSON object")
+        _check_envelope(response.get('code'), response.get('error'))
+        return Forecast(response['result'], hours)
+
+
+class OrjsonCodec(JSONCodec):
+    """orjson codec"""
+
+    name = 'orjson'
+
+    def __init__(self):
+        import orjson
+        self._orjson = orjson
+
+    def loads(self, data) -> Any:
+        return self._orjson.loads(data)
+
+    def encode(self, obj: Any, indent: bool = False) -> bytes:
+        option = self._orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= self._orjson.OPT_INDENT_2
+        return self._orjson.dumps(obj, option=option)
+
+    def dumps(self, obj: Any, indent: bool = False) -> str:
+        return self.encode(obj, indent).decode('utf-8')
+
+
+def _response_type(msgspec) -> type:
+    """Build the msgspec structure of an API response"""
+
+    class _Item(msgspec.Struct):
+        """One forecast hour as sent by the API (fields in ForecastItem order)
+
+        Values are float like ForecastItem.from_dict (integers are converted).
+        """
+
+        datetime: str
+        TMP: float
+        APCP: float
+        WSPD: float
+        WDIR: float
+        RH: float
+        TCDC: float
+        PRES: float
+
+    class _Result(msgspec.Struct):
+        latlng: str
+        grib2file_time: str
+        forecast: List[_Item]
+
+    class _Response(msgspec.Struct):
+        code: Optional[int] = None
+        error: Optional[str] = None
+        result: Optional[_Result] = None
+
+    return _Response
+
+
+class MsgspecCodec(JSONCodec):
+    """msgspec codec with typed response decoding"""
+
+    name = 'msgspec'
+
+    def __init__(self):
+        import msgspec
+        self._msgspec = msgspec
+        self._decoder = msgspec.json.Decoder()
+        self._response_decoder = msgspec.json.Decoder(_response_type(msgspec))
+        self._encoder = msgspec.json.Encoder()
+
+    def loads(self, data) -> Any:
+        msgspec = self._msgspec
+        try:
+            return self._decoder.decode(data)
+        except msgspec.DecodeError as e:
+            raise ValueError(str(e)) from None
+
+    def encode(self, obj: Any, indent: bool = False) -> bytes:
+        data = self._encoder.encode(obj)
+        return self._msgspec.json.format(data, indent=2) if indent else data
+
+    def dumps(self, obj: Any, indent: bool = False) -> str:
+        return self.encode(obj, indent).decode('utf-8')
+
+    def decode_forecast(self, data, hours: int = 24) -> Forecast:
+        msgspec = self._msgspec
+        try:
+            response = self._response_decoder.decode(data)
+        except msgspec.ValidationError:
+            # Unexpected shape (e.g. null values): decode loosely instead
+            return super().decode_forecast(data, hours)
+        except msgspec.DecodeError as e:
+            raise ValueError(str(e)) from None
+
+        _check_envelope(response.code, response.error)
+        result = response.result
+        if result is None:
+            raise KeyError('result')
+
+        lat, lng = result.latlng.split(',')
+        astuple = msgspec.structs.astuple
+        items = [ForecastItem(*astuple(item)) for item in result.forecast[:hours]]
+        return Forecast._from_items(float(lat), float(lng), result.grib2file_time, items)
+
+
+@functools.lru_cache(maxsize=None)
+def installed_codecs() -> Dict[str, JSONCodec]:
+    """Get the installed backends, fastest first (imported on the first call)
+
+    Returns:
+        dict: Backend name -> JSONCodec
+    """
+    codecs = {}
+    for codec_class in (OrjsonCodec, MsgspecCodec):
+        try:
+            codecs[codec_class.name] = codec_class()
+        except ImportError:
+            pass
+    codecs['json'] = JSONCodec()
+    return codecs
+
+
+def get_codec(name: Optional[str] = None) -> JSONCodec:
+    """Get a codec by backend name
+
+    Args:
+        name: 'orjson', 'msgspec' or 'json' (default: fastest installed)
+
+    Returns:
+        JSONCodec
+
+    Raises:
+        ValueError: If the backend is not installed
+    """
+    codecs = installed_codecs()
+    if not name:
+        return next(iter(codecs.values()))
+    try:
+        return codecs[name]
+    except KeyError:
+        raise ValueError(f"JSON codec '{name}' is not available (installed: {', '.join(codecs)})") from None
+
+
+@functools.lru_cache(maxsize=None)
+def default_codecs() -> Tuple[JSONCodec, JSONCodec]:
+    """Get the default codecs (WEATHER_JSON_CODEC is read on the first call)
+
+    Returns:
+        tuple: (general encode/decode codec, API response codec). The first is
+        the fastest installed backend; API responses use typed decoding when
+        msgspec is installed.
+    """
+    forced = os.getenv('WEATHER_JSON_CODEC', '')
+    forecast_name = forced or ('msgspec' if 'msgspec' in installed_codecs() else None)
+    return get_codec(forced), get_codec(forecast_name)
+
+
+def loads(data) -> Any:
+    """Decode JSON bytes or str with the default codec"""
+    return default_codecs()[0].loads(data)
+
+
+def encode(obj: Any, indent: bool = False) -> bytes:
+    """Encode to UTF-8 JSON bytes with the default codec"""
+    return default_codecs()[0].encode(obj, indent)
+
+
+def dumps(obj: Any, indent: bool = False) -> str:
+    """Encode to a JSON str with the default codec"""
+    return default_codecs()[0].dumps(obj, indent)
+
+
+def decode_forecast(data, hours: int = 24) -> Forecast:
+    """Decode an API response into a Forecast with the API response codec"""
+    return default_codecs()[1].decode_forecast(data, hours)
@@ -0,0 +1,429 @@
+"""
+Threshold and window rules evaluated over many forecasts
+
+Rules are declared once, compiled into column operations and evaluated
+over whole forecast series. Only triggered (site, rule, time window)
+events are returned.
+
+Usage:
+    from rules import Rule, RuleSet, PRESET_RULES
+
+    rules = RuleSet([
+        Rule('heavy_rain', 'precipitation', '>=', 30, window=3, aggregate='sum'),
+        Rule('strong_wind', 'wind_speed', '>=', 15),
+        Rule('overnight_frost', 'temperature', '<', 0, hours_of_day=(18, 6)),
+    ])
+    for event in rules.evaluate({'tokyo': forecast_tokyo, 'osaka': forecast_osaka}):
+        print(event.site, event.rule, event.start, event.end, event.peak)
+
+Sites whose forecasts hold the same hours of one underlying Forecast (e.g.
+points in the same grid cell served from a cache) are evaluated once.
+"""
+
+import operator
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Mapping, Optional, Sequence, Tuple, Union
+
+try:
+    from .diff import DEFAULT_TOLERANCES, diff_forecasts
+    from .weather_forecast_client import BINARY_FIELDS, Forecast
+except ImportError:
+    from diff import DEFAULT_TOLERANCES, diff_forecasts
+    from weather_forecast_client import BINARY_FIELDS, Forecast
+
+
+_OPERATORS: Dict[str, Callable[[float, float], bool]] = {
+    '>=': operator.ge,
+    '>': operator.gt,
+    '<=': operator.le,
+    '<': operator.lt,
+}
+_AGGREGATES = ('sum', 'mean', 'min', 'max')
+
+
+@dataclass(frozen=True)
+class Rule:
+    """Declarative threshold rule
+
+    Attributes:
+        name: Rule name reported in events
+        variable: Forecast field or derived variable (e.g. 'precipitation', 'heat_index')
+        op: Comparison with the threshold ('>=', '>', '<=' or '<')
+        threshold: Threshold value
+        window: Window length in hours; the aggregate over each window is compared
+        aggregate: 'sum', 'mean', 'min' or 'max' over the window
+        hours_of_day: Only windows whose hours all fall in [start, end) by the
+            forecast datetime; wraps around midnight when start > end
+        severity: Free-form severity reported in events
+    """
+
+    name: str
+    variable: str
+    op: str
+    threshold: float
+    window: int = 1
+    aggregate: str = 'sum'
+    hours_of_day: Optional[Tuple[int, int]] = None
+    severity: str = 'warning'
+
+    def __post_init__(self):
+        if self.op not in _OPERATORS:
+            raise ValueError(f"Unsupported operator: {self.op}")
+        if self.aggregate not in _AGGREGATES:
+            raise ValueError(f"Unsupported aggregate: {self.aggregate}")
+        if self.window < 1:
+            raise ValueError("window must be at least 1 hour")
+
+
+@dataclass(frozen=True)
+class AlertEvent:
+    """Triggered rule for one site over a merged time window"""
+
+    site: Hashable
+    rule: str
+    severity: str
+    start: str      # datetime of the first hour
+    end: str        # datetime of the last hour
+    hours: int      # number of hours covered
+    peak: float     # most extreme aggregated value in the window
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert to dictionary"""
+        return {
+            'site': self.site,
+            'rule': self.rule,
+            'severity': self.severity,
+            'start': self.start,
+            'end': self.end,
+            'hours': self.hours,
+            'peak': self.peak,
+        }
+
+
+# Window = (first hour index, last hour index, peak value)
+Window = Tuple[int, int, float]
+
+
+def _rolling(values: Sequence[float], window: int, aggregate: str) -> List[float]:
+    """Aggregate over every full window: result[i] covers values[i:i + window]"""
+    if window == 1:
+        return list(values)
+    count = len(values) - window + 1
+    if count <= 0:
+        return []
+
+    if aggregate in ('sum', 'mean'):
+        prefix = [0.0]
+        for value in values:
+            prefix.append(prefix[-1] + value)
+        sums = [prefix[i + window] - prefix[i] for i in range(count)]
+        return sums if aggregate == 'sum' else [s / window for s in sums]
+
+    # Monotonic deque: O(n) sliding min/max
+    better = operator.le if aggregate == 'min' else operator.ge
+    result = []
+    candidates: deque = deque()
+    for i, value in enumerate(values):
+        while candidates and better(value, values[candidates[-1]]):
+            candidates.pop()
+        candidates.append(i)
+        if candidates[0] <= i - window:
+            candidates.popleft()
+        if i >= window - 1:
+            result.append(values[candidates[0]])
+    return result
+
+
+class _CompiledRule:
+    """Rule bound to its comparison, aggregation and cheap pre-filter"""
+
+    def __init__(self, rule: Rule):
+        self.rule = rule
+        self.compare = _OPERATORS[rule.op]
+        self.upward = rule.op in ('>=', '>')
+        self.extreme = max if self.upward else min
+
+        if rule.hours_of_day is not None:
+            start, end = rule.hours_of_day
+            if start <= end:
+                self.allowed = frozenset(range(start, end))
+            else:
+                self.allowed = frozenset(range(start, 24)) | frozenset(range(0, end))
+        else:
+            self.allowed = None
+
+    def could_trigger(self, values: Sequence[float]) -> bool:
+        """Reject series that cannot trigger, using only builtins over the column"""
+        rule = self.rule
+        if not values:
+            return False
+        if rule.window == 1 or rule.aggregate in ('min', 'max', 'mean'):
+            # No window aggregate can exceed the series extreme
+            return self.compare(self.extreme(values), rule.threshold)
+        if self.upward and min(values) >= 0:
+            # Window sums of non-negative values never exceed the series total
+            return self.compare(sum(values), rule.threshold)
+        return True
+
+    def windows(self, forecast: Forecast) -> List[Window]:
+        """Triggered windows of one forecast, merged when they overlap or touch"""
+        rule = self.rule
+        if rule.variable in BINARY_FIELDS:
+            values = forecast.column(rule.variable)
+        else:
+            values = forecast.derived(rule.variable)
+        if not self.could_trigger(values):
+            return []
+
+        rolled = _rolling(values, rule.window, rule.aggregate)
+        threshold, compare = rule.threshold, self.compare
+        hits = [i for i, value in enumerate(rolled) if compare(value, threshold)]
+
+        if hits and self.allowed is not None:
+            allowed = [hour in self.allowed for hour in forecast.derived('hour_of_day')]
+            prefix = [0]
+            for ok in allowed:
+                prefix.append(prefix[-1] + ok)
+            hits = [i for i in hits if prefix[i + rule.window] - prefix[i] == rule.window]
+
+        return self.merge((i, i + rule.window - 1, rolled[i]) for i in hits)
+
+    def merge(self, windows: Iterable[Window]) -> List[Window]:
+        """Merge windows (sorted by first hour) that overlap or touch"""
+        merged: List[Window] = []
+        for first, last, peak in windows:
+            if merged and first <= merged[-1][1] + 1:
+                start, end, previous = merged[-1]
+                merged[-1] = (start, max(end, last), self.extreme(previous, peak))
+            else:
+                merged.append((first, last, peak))
+        return merged
+
+
+def _shared_key(forecast: Forecast) -> Tuple[int, int]:
+    # Heads and relocated copies of a cached forecast (Forecast.head/_located)
+    # hold its first hours, so they share the windows of equal length
+    root = forecast
+    while root._source is not None:
+        root = root._source
+    return id(root), len(forecast)
+
+
+class RuleSet:
+    """Rules compiled once and evaluated over many forecasts"""
+
+    def __init__(self, rules: Iterable[Rule]):
+        """Compile rules
+
+        Args:
+            rules: Rules to evaluate
+
+        Raises:
+            ValueError: If two rules share a name
+        """
+        self.rules = list(rules)
+        names = [rule.name for rule in self.rules]
+        if len(set(names)) != len(names):
+            raise ValueError("Rule names must be unique")
+        self._compiled = [_CompiledRule(rule) for rule in self.rules]
+
+    def windows(self, forecast: Forecast) -> Dict[str, List[Window]]:
+        """Evaluate every rule on one forecast
+
+        Args:
+            forecast: Forecast to evaluate
+
+        Returns:
+            dict: Rule name -> triggered (first hour, last hour, peak) windows;
+            rules that did not trigger are omitted
+        """
+        result = {}
+        for compiled in self._compiled:
+            found = compiled.windows(forecast)
+            if found:
+                result[compiled.rule.name] = found
+        return result
+
+    def events(self, site: Hashable, forecast: Forecast,
+               windows: Optional[Dict[str, List[Window]]] = None) -> List[AlertEvent]:
+        """Convert triggered windows of one forecast into events
+
+        Args:
+            site: Site identifier reported in the events
+            forecast: Evaluated forecast
+            windows: Result of windows(forecast) (computed when omitted)
+
+        Returns:
+            List of AlertEvent in rule order
+        """
+        if windows is None:
+            windows = self.windows(forecast)
+        times = forecast.column('datetime')
+        events = []
+        for rule in self.rules:
+            for first, last, peak in windows.get(rule.name, ()):
+                events.append(AlertEvent(
+                    site, rule.name, rule.severity, times[first], times[last], last - first + 1, peak
+                ))
+        return events
+
+    def evaluate(self, sites: Union[Mapping[Hashable, Forecast], Iterable[Tuple[Hashable, Forecast]]]
+                 ) -> List[AlertEvent]:
+        """Evaluate every rule for many sites
+
+        Args:
+            sites: Mapping or iterable of (site, Forecast). Sites whose
+                forecasts are the same hours of one Forecast (the same object,
+                or copies from a forecast cache for the same grid cell) are
+                evaluated once
+
+        Returns:
+            List of triggered AlertEvent (sites in input order)
+        """
+        items = sites.items() if isinstance(sites, Mapping) else sites
+        # The forecast is kept in the entry so that its root stays alive (ids are not reused)
+        evaluated: Dict[Tuple[int, int], Tuple[Forecast, Dict[str, List[Window]]]] = {}
+        events = []
+        for site, forecast in items:
+            key = _shared_key(forecast)
+            entry = evaluated.get(key)
+            if entry is None:
+                entry = evaluated[key] = (forecast, self.windows(forecast))
+            if entry[1]:
+                events.extend(self.events(site, forecast, entry[1]))
+        return events
+
+
+class IncrementalRuleSet:
+    """Re-evaluates rules only for sites whose forecast materially changed
+
+    Each update() compares every site's forecast with the one seen in the
+    previous update (see diff.diff_forecasts). When none of the variables
+    used by the rules changed beyond its tolerance, the previous windows
+    are shifted to the new run and only the newly added hours at the end
+    are evaluated. Windows that began before the new run's first hour, or
+    that end after its last compared hour (a shorter run), are evaluated
+    again on those hours.
+    """
+
+    def __init__(self, rules: RuleSet, tolerances: Optional[Mapping[str, float]] = None):
+        """Create an incremental evaluator
+
+        Args:
+            rules: Compiled rules
+            tolerances: Variable -> largest change that is not material
+                (default: diff.DEFAULT_TOLERANCES; variables without a
+                tolerance must not change at all)
+        """
+        self.rules = rules
+        tolerances = DEFAULT_TOLERANCES if tolerances is None else tolerances
+        self.tolerances = {rule.variable: tolerances.get(rule.variable, 0.0) for rule in rules.rules}
+        self.evaluated = 0
+        self.reused = 0
+        self._previous: Dict[Hashable, Tuple[Forecast, Dict[str, List[Window]]]] = {}
+
+    def update(self, sites: Union[Mapping[Hashable, Forecast], Iterable[Tuple[Hashable, Forecast]]]
+               ) -> Tuple[List[AlertEvent], List[Hashable]]:
+        """Evaluate the rules for a new run
+
+        Sites missing from this update are forgotten.
+
+        Args:
+            sites: Mapping or iterable of (site, Forecast)
+
+        Returns:
+            (all triggered events, sites that were fully re-evaluated)
+        """
+        items = sites.items() if isinstance(sites, Mapping) else sites
+        current: Dict[Hashable, Tuple[Forecast, Dict[str, List[Window]]]] = {}
+        events = []
+        changed = []
+
+        for site, forecast in items:
+            windows = None
+            previous = self._previous.get(site)
+            if previous is not None:
+                windows = self._carry_over(previous, forecast)
+
+            if windows is None:
+                windows = self.rules.windows(forecast)
+                self.evaluated += 1
+                changed.append(site)
+            else:
+                self.reused += 1
+
+            current[site] = (forecast, windows)
+            if windows:
+                events.extend(self.rules.events(site, forecast, windows))
+
+        self._previous = current
+        return events, changed
+
+    def _carry_over(self, previous: Tuple[Forecast, Dict[str, List[Window]]],
+                    forecast: Forecast) -> Optional[Dict[str, List[Window]]]:
+        old, old_windows = previous
+        if old is forecast:
+            return old_windows
+
+        diff = diff_forecasts(old, forecast, self.tolerances)
+        if diff.changed or diff.new_start != 0:
+            return None
+
+        # Old hour index i is new index i + shift. Windows that began before the
+        # new run are re-evaluated on the leading hours, and windows touching the
+        # added hours or running past the compared hours on the trailing ones;
+        # every other window is reused as is
+        shift = -diff.old_start
+        longest = max(rule.window for rule in self.rules.rules)
+
+        reused = {}
+        head_end = 0
+        tail_start = max(0, diff.hours - longest + 1) if diff.added_hours else None
+        for name, found in old_windows.items():
+            reused[name] = []
+            for first, last, peak in found:
+                if last + shift < 0:
+                    continue
+                if first + shift < 0:
+                    head_end = max(head_end, last + shift + longest)
+                elif last + shift >= diff.hours:
+                    tail_start = first + shift if tail_start is None else min(tail_start, first + shift)
+                else:
+                    reused[name].append((first + shift, last + shift, peak))
+
+        extra = []
+        if head_end:
+            extra.append((0, self._slice_windows(forecast, 0, head_end)))
+        if tail_start is not None and tail_start < len(forecast):
+            extra.append((tail_start, self._slice_windows(forecast, tail_start, len(forecast))))
+
+        windows = {}
+        for compiled in self.rules._compiled:
+            name = compiled.rule.name
+            candidates = list(reused.get(name, ()))
+            for offset, found in extra:
+                candidates.extend((first + offset, last + offset, peak) for first, last, peak in found.get(name, ()))
+            merged = compiled.merge(sorted(candidates))
+            if merged:
+                windows[name] = merged
+        return windows
+
+    def _slice_windows(self, forecast: Forecast, start: int, end: int) -> Dict[str, List[Window]]:
+        part = Forecast._from_items(
+            forecast.latitude, forecast.longitude, forecast.grib2file_time, forecast.data[start:end]
+        )
+        return self.rules.windows(part)
+
+
+# Commonly used rules (names are also used by the MCP check_weather_alerts tool)
+PRESET_RULES: Dict[str, Rule] = {
+    rule.name: rule
+    for rule in (
+        Rule('heavy_rain', 'precipitation', '>=', 30, window=3, aggregate='sum', severity='warning'),
+        Rule('intense_rain', 'precipitation', '>=', 20, severity='warning'),
+        Rule('strong_wind', 'wind_speed', '>=', 15, severity='warning'),
+        Rule('overnight_frost', 'temperature', '<', 0, hours_of_day=(18, 6), severity='advisory'),
+        Rule('heat_stress', 'heat_index', '>=', 32, severity='advisory'),
+    )
+}
@@ -0,0 +1,236 @@
+"""
+Adaptive upstream request scheduler
+
+All requests to the upstream API go through one scheduler per process so
+that interactive calls are not starved by bulk or background work and
+the upstream token is not pushed into throttling.
+
+- Concurrency is adjusted with AIMD: the limit grows by about one slot per
+  round trip while responses are healthy, and is halved on 429/5xx,
+  request errors or latency rising well above the observed baseline.
+- Requests wait in priority lanes (interactive > prefetch > bulk). Lower
+  lanes may only use part of the limit, leaving headroom for interactive
+  requests that arrive later.
+- A Retry-After header pauses dispatch for every lane.
+
+Usage:
+    from scheduler import default_scheduler, PRIORITY_BULK
+
+    with default_scheduler().slot(PRIORITY_BULK) as slot:
+        response = requests.get(url, timeout=30)
+        slot.record(response.status_code, response.headers.get('Retry-After'))
+"""
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from typing import Dict, Iterator, Optional
+
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_PREFETCH = 1
+PRIORITY_BULK = 2
+
+PRIORITY_NAMES = ('interactive', 'prefetch', 'bulk')
+
+# Share of the concurrency limit each lane may use
+LANE_SHARES = (1.0, 0.9, 0.75)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header
+
+    Args:
+        value: Header value (delay in seconds or an HTTP date)
+
+    Returns:
+        Delay in seconds, or None if missing or invalid
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class Slot:
+    """Permission to send one upstream request; record its outcome with record()"""
+
+    def __init__(self):
+        self.status: Optional[int] = None
+        self.retry_after: Optional[float] = None
+
+    def record(self, status: int, retry_after: Optional[str] = None) -> None:
+        """Record the response status and Retry-After header
+
+        Args:
+            status: HTTP status code
+            retry_after: Retry-After header value, if any
+        """
+        self.status = status
+        self.retry_after = parse_retry_after(retry_after)
+
+
+class RequestScheduler:
+    """AIMD concurrency limiter with priority lanes"""
+
+    def __init__(self, initial_limit: float = 4, min_limit: float = 1, max_limit: float = 32,
+                 backoff: float = 0.5, latency_tolerance: float = 2.0, backoff_cooldown: float = 1.0):
+        """Initialize the scheduler
+
+        Args:
+            initial_limit: Starting number of concurrent requests
+            min_limit: Lower bound of the limit
+            max_limit: Upper bound of the limit
+            backoff: Factor applied to the limit on congestion
+            latency_tolerance: Latency above baseline * tolerance counts as congestion
+            backoff_cooldown: Minimum seconds between two decreases
+        """
+        self.limit = float(initial_limit)
+        self.min_limit = float(min_limit)
+        self.max_limit = float(max_limit)
+        self.backoff = backoff
+        self.latency_tolerance = latency_tolerance
+        self.backoff_cooldown = backoff_cooldown
+
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.latency_baseline: Optional[float] = None
+
+        self._cond = threading.Condition()
+        self._lanes = tuple(deque() for _ in PRIORITY_NAMES)
+        self._last_backoff = 0.0
+        self._counters = {'completed': 0, 'throttled': 0, 'failed': 0, 'backoffs': 0}
+
+    @contextmanager
+    def slot(self, priority: int = PRIORITY_INTERACTIVE, timeout: Optional[float] = None) -> Iterator[Slot]:
+        """Wait for permission to send a request
+
+        Args:
+            priority: PRIORITY_INTERACTIVE, PRIORITY_PREFETCH or PRIORITY_BULK
+            timeout: Maximum seconds to wait for a slot
+
+        Yields:
+            Slot on which the caller records the response
+
+        Raises:
+            TimeoutError: If no slot became available within timeout
+        """
+        self._acquire(priority, timeout)
+        slot = Slot()
+        started = time.monotonic()
+        try:
+            yield slot
+        except BaseException:
+            self._release(slot, time.monotonic() - started, failed=True)
+            raise
+        self._release(slot, time.monotonic() - started, failed=False)
+
+    def stats(self) -> Dict[str, float]:
+        """Get current limit, queue lengths and outcome counters"""
+        with self._cond:
+            stats = dict(self._counters)
+            stats.update(
+                limit=round(self.limit, 2),
+                in_flight=self.in_flight,
+                latency_baseline=self.latency_baseline or 0.0,
+            )
+            for name, lane in zip(PRIORITY_NAMES, self._lanes):
+                stats[f'waiting_{name}'] = len(lane)
+            return stats
+
+    def _can_run(self, ticket: object, priority: int, now: float) -> bool:
+        if now < self.paused_until or self._lanes[priority][0] is not ticket:
+            return False
+        if any(self._lanes[higher] for higher in range(priority)):
+            return False
+        return self.in_flight < max(1, int(self.limit * LANE_SHARES[priority]))
+
+    def _acquire(self, priority: int, timeout: Optional[float]) -> None:
+        ticket = object()
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        with self._cond:
+            lane = self._lanes[priority]
+            lane.append(ticket)
+            try:
+                while True:
+                    now = time.time()
+                    if self._can_run(ticket, priority, now):
+                        break
+
+                    wait = None if deadline is None else deadline - time.monotonic()
+                    if wait is not None and wait <= 0:
+                        raise TimeoutError('Timed out waiting for an upstream request slot')
+                    if self.paused_until > now:
+                        pause = self.paused_until - now
+                        wait = pause if wait is None else min(wait, pause)
+                    self._cond.wait(wait)
+            except BaseException:
+                lane.remove(ticket)
+                self._cond.notify_all()
+                raise
+
+            lane.popleft()
+            self.in_flight += 1
+            self._cond.notify_all()
+
+    def _release(self, slot: Slot, latency: float, failed: bool) -> None:
+        with self._cond:
+            self.in_flight -= 1
+
+            throttled = slot.status is not None and (slot.status == 429 or slot.status >= 500)
+            if slot.retry_after is not None:
+                self.paused_until = max(self.paused_until, time.time() + slot.retry_after)
+
+            if throttled:
+                self._counters['throttled'] += 1
+                self._decrease()
+            elif failed and slot.status is None:
+                # No response at all (timeout, connection error)
+                self._counters['failed'] += 1
+                self._decrease()
+            elif failed:
+                # Client errors (4xx) say nothing about upstream load
+                self._counters['failed'] += 1
+            else:
+                self._counters['completed'] += 1
+                if self.latency_baseline is None:
+                    self.latency_baseline = latency
+                if latency > self.latency_baseline * self.latency_tolerance:
+                    self._decrease()
+                else:
+                    # Additive increase: about +1 per limit's worth of responses
+                    self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+                    self.latency_baseline += 0.05 * (latency - self.latency_baseline)
+
+            self._cond.notify_all()
+
+    def _decrease(self) -> None:
+        now = time.monotonic()
+        if now - self._last_backoff < self.backoff_cooldown:
+            return
+        self._last_backoff = now
+        self._counters['backoffs'] += 1
+        self.limit = max(self.min_limit, self.limit * self.backoff)
+
+
+_default_scheduler: Optional[RequestScheduler] = None
+_default_lock = threading.Lock()
+
+
+def default_scheduler() -> RequestScheduler:
+    """Get the process-wide scheduler shared by all clients"""
+    global _default_scheduler
+
+    with _default_lock:
+        if _default_scheduler is None:
+            _default_scheduler = RequestScheduler()
+        return _default_scheduler
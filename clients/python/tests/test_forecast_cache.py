@@ -0,0 +1,75 @@
+"""
+Tests for forecast_cache.SharedForecastCache
+
+Run:
+    python -m unittest discover -s tests
+"""
+
+import os
+import random
+import sys
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from forecast_cache import SharedForecastCache  # noqa: E402
+from grid import grid_cell  # noqa: E402
+from weather_forecast_client import Forecast  # noqa: E402
+
+
+def float64_forecast(hours=172):
+    """Forecast whose columns all fall back to float64 (the largest payload)"""
+    rng = random.Random(0)
+    start = datetime(2025, 1, 1, 9)
+    rows = [
+        {
+            'datetime': (start + timedelta(hours=h)).strftime('%Y-%m-%d %H:%M:%S'),
+            **{name: rng.random() for name in ('TMP', 'APCP', 'WSPD', 'WDIR', 'RH', 'TCDC', 'PRES')},
+        }
+        for h in range(hours)
+    ]
+    return Forecast({'latlng': '35.7,139.625', 'grib2file_time': '2025-01-01 06:00:00',
+                     'forecast': rows}, hours)
+
+
+class SharedForecastCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.cache = SharedForecastCache(os.path.join(directory.name, 'cache.bin'), sets=8)
+        self.addCleanup(self.cache.close)
+        self.cell = grid_cell(35.7, 139.625)
+
+    def test_float64_forecast_is_cached(self):
+        forecast = float64_forecast()
+        fetched = []
+
+        def fetch():
+            fetched.append(1)
+            return forecast
+
+        first = self.cache.get_or_fetch(self.cell, fetch)
+        second = self.cache.get_or_fetch(self.cell, fetch)
+
+        self.assertEqual(len(fetched), 1)
+        self.assertEqual(self.cache.uncached, 0)
+        self.assertEqual(first.to_dicts(), forecast.to_dicts())
+        self.assertEqual(second.to_dicts(), forecast.to_dicts())
+
+    def test_oversized_forecast_is_counted(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = SharedForecastCache(os.path.join(directory, 'small.bin'), sets=8, slot_size=4096)
+            try:
+                forecast = float64_forecast()
+                self.assertFalse(cache.put(self.cell, forecast))
+                self.assertIs(cache.get_or_fetch(self.cell, lambda: forecast), forecast)
+                self.assertEqual(cache.uncached, 1)
+            finally:
+                cache.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
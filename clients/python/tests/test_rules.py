@@ -0,0 +1,100 @@
+"""
+Tests for rules.IncrementalRuleSet
+
+Run:
+    python -m unittest discover -s tests
+"""
+
+import os
+import random
+import sys
+import unittest
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from rules import PRESET_RULES, IncrementalRuleSet, RuleSet  # noqa: E402
+from weather_forecast_client import Forecast  # noqa: E402
+
+
+def make_forecast(series, start, hours, run):
+    """Forecast of series[start:start + hours] (hour 0 is 2025-01-01 00:00)"""
+    t0 = datetime(2025, 1, 1) + timedelta(hours=start)
+    rows = [
+        {'datetime': (t0 + timedelta(hours=h)).strftime('%Y-%m-%d %H:%M:%S'), **series[start + h]}
+        for h in range(hours)
+    ]
+    return Forecast({'latlng': '35.7,139.625', 'grib2file_time': run, 'forecast': rows}, hours)
+
+
+def make_series(rng, hours):
+    return [
+        {
+            'TMP': rng.uniform(-5, 35), 'APCP': rng.choice([0.0, 0.0, 5.0, 12.0, 25.0]),
+            'WSPD': rng.uniform(5, 25), 'WDIR': 0.0, 'RH': rng.uniform(20, 100),
+            'TCDC': 50.0, 'PRES': 1000.0,
+        }
+        for _ in range(hours)
+    ]
+
+
+class RuleSetTest(unittest.TestCase):
+
+    def test_cached_cell_evaluated_once(self):
+        series = [dict(row, WSPD=20.0) for row in make_series(random.Random(0), 48)]
+        cached = make_forecast(series, 0, 48, '2025-01-01 00:00:00')
+        rules = RuleSet([PRESET_RULES['strong_wind']])
+        calls = []
+        windows = rules.windows
+        rules.windows = lambda forecast: calls.append(forecast) or windows(forecast)
+
+        # As returned by WeatherForecastClient.get_forecast with a cache
+        events = rules.evaluate([
+            ('a', cached._located(35.71, 139.62, 24)),
+            ('b', cached._located(35.69, 139.63, 24)),
+            ('c', cached._located(35.69, 139.63, 12)),
+        ])
+
+        self.assertEqual(len(calls), 2)
+        self.assertEqual([event.site for event in events], ['a', 'b', 'c'])
+        self.assertEqual(events[0].hours, 24)
+        self.assertEqual(events[2].hours, 12)
+
+
+class IncrementalRuleSetTest(unittest.TestCase):
+
+    def setUp(self):
+        self.rules = RuleSet(PRESET_RULES.values())
+
+    def test_shorter_run(self):
+        # Strong wind over the whole old run: its window ends after the new run
+        series = [dict(row, WSPD=20.0) for row in make_series(random.Random(0), 60)]
+        incremental = IncrementalRuleSet(RuleSet([PRESET_RULES['strong_wind']]))
+        incremental.update({'tokyo': make_forecast(series, 0, 48, '2025-01-01 00:00:00')})
+
+        forecast = make_forecast(series, 6, 24, '2025-01-01 06:00:00')
+        events, changed = incremental.update({'tokyo': forecast})
+
+        self.assertEqual(changed, [])
+        self.assertEqual(events, RuleSet([PRESET_RULES['strong_wind']]).evaluate({'tokyo': forecast}))
+        self.assertEqual(events[0].end, forecast.column('datetime')[-1])
+
+    def test_matches_full_evaluation(self):
+        rng = random.Random(1)
+        for _ in range(500):
+            series = make_series(rng, 200)
+            old_hours = rng.randint(1, 60)
+            shift = rng.randint(0, old_hours - 1)
+            new_hours = rng.randint(1, 80)
+
+            incremental = IncrementalRuleSet(self.rules)
+            incremental.update({'tokyo': make_forecast(series, 0, old_hours, 'old')})
+            forecast = make_forecast(series, shift, new_hours, 'new')
+            events, _ = incremental.update({'tokyo': forecast})
+
+            with self.subTest(old_hours=old_hours, shift=shift, new_hours=new_hours):
+                self.assertEqual(events, self.rules.evaluate({'tokyo': forecast}))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -9,16 +9,103 @@ Usage:
     print(forecast.temperature_at(0))
 """
 
-import requests
-from typing import List, Optional, Dict, Any
+import calendar
+import math
+import struct
+import sys
+import threading
+import time
+from array import array
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError, as_completed, wait
+from typing import List, Optional, Dict, Any, Deque, Callable
 from dataclasses import dataclass
 
+try:
+    from .grid import grid_cell
+    from .scheduler import PRIORITY_INTERACTIVE, default_scheduler
+except ImportError:
+    from grid import grid_cell
+    from scheduler import PRIORITY_INTERACTIVE, default_scheduler
+
+
+# Binary serialization layout (see Forecast.to_bytes)
+BINARY_MAGIC = b'WFCB'
+BINARY_VERSION = 2
+BINARY_DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+BINARY_FIELDS = (
+    'temperature', 'precipitation', 'wind_speed', 'wind_direction',
+    'humidity', 'cloud_cover', 'pressure'
+)
+# magic, version, hours, latitude, longitude, start time (epoch), grib2file_time length
+_BINARY_HEADER = struct.Struct('<4sHHddqH2x')
+# Columns are int32 fixed-point with up to this many decimals ...
+BINARY_MAX_DECIMALS = 6
+# ... or float64 (marked by this scale) when no such scale reproduces the values
+BINARY_FLOAT64 = 255
+
+COMPASS_DIRECTIONS = ['N', 'NNE', 'NE', 'ENE', 'E', 'ESE', 'SE', 'SSE',
+                      'S', 'SSW', 'SW', 'WSW', 'W', 'WNW', 'NW', 'NNW']
+
+# Derived variables by name (see register_derived and Forecast.derived)
+DERIVED_VARIABLES: Dict[str, Callable[['Forecast'], List[Any]]] = {}
+
+
+def register_derived(name: str):
+    """Register a derived variable computed over a whole forecast series
+
+    The decorated function receives a Forecast and returns one value per
+    hour. It is called at most once per forecast; use Forecast.column()
+    and Forecast.derived() inside it so its inputs are memoized too.
+
+    Args:
+        name: Variable name passed to Forecast.derived()
+    """
+    def decorator(func: Callable[['Forecast'], List[Any]]):
+        DERIVED_VARIABLES[name] = func
+        return func
+    return decorator
+
+
+def _decimal_places(values: List[float]) -> Optional[int]:
+    """Fewest decimals (up to BINARY_MAX_DECIMALS) that reproduce every value as int32 fixed-point"""
+    if not all(math.isfinite(v) for v in values):
+        return None
+    for decimals in range(BINARY_MAX_DECIMALS + 1):
+        factor = 10 ** decimals
+        scaled = [round(v * factor) for v in values]
+        if all(-2 ** 31 <= n < 2 ** 31 and n / factor == v for n, v in zip(scaled, values)):
+            return decimals
+    return None
+
+
+def _compass(degrees: float) -> str:
+    return COMPASS_DIRECTIONS[int(round(degrees / 22.5) % 16)]
+
+
+def _weather_icon(precipitation: float, cloud_cover: float) -> str:
+    if precipitation > 1.0:
+        return '🌧️'  # Rain
+    elif precipitation > 0.1:
+        return '🌦️'  # Light rain
+    elif cloud_cover > 70:
+        return '☁️'  # Cloudy
+    elif cloud_cover > 30:
+        return '⛅'  # Partly cloudy
+    else:
+        return '☀️'  # Sunny
+
 
 class WeatherAPIError(Exception):
     """Custom exception for API errors"""
     pass
 
 
+class DeadlineExceeded(WeatherAPIError):
+    """Raised when a request does not complete within its deadline"""
+    pass
+
+
 @dataclass
 class ForecastItem:
     """Individual forecast item"""
@@ -34,16 +121,20 @@ class ForecastItem:
 
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> 'ForecastItem':
-        """Create ForecastItem from API data dictionary"""
+        """Create ForecastItem from API data dictionary
+
+        Values are converted to float so that forecasts decoded from the API
+        and restored from the binary format are identical.
+        """
         return cls(
             datetime=data['datetime'],
-            temperature=data['TMP'],
-            precipitation=data['APCP'],
-            wind_speed=data['WSPD'],
-            wind_direction=data['WDIR'],
-            humidity=data['RH'],
-            cloud_cover=data['TCDC'],
-            pressure=data['PRES']
+            temperature=float(data['TMP']),
+            precipitation=float(data['APCP']),
+            wind_speed=float(data['WSPD']),
+            wind_direction=float(data['WDIR']),
+            humidity=float(data['RH']),
+            cloud_cover=float(data['TCDC']),
+            pressure=float(data['PRES'])
         )
 
     def wind_direction_compass(self) -> str:
@@ -52,10 +143,7 @@ class ForecastItem:
         Returns:
             str: Compass direction (e.g., "N", "NE", "E")
         """
-        directions = ['N', 'NNE', 'NE', 'ENE', 'E', 'ESE', 'SE', 'SSE',
-                     'S', 'SSW', 'SW', 'WSW', 'W', 'WNW', 'NW', 'NNW']
-        index = int(round(self.wind_direction / 22.5) % 16)
-        return directions[index]
+        return _compass(self.wind_direction)
 
     def weather_icon(self) -> str:
         """Get weather condition icon
@@ -63,16 +151,7 @@ class ForecastItem:
         Returns:
             str: Weather icon emoji
         """
-        if self.precipitation > 1.0:
-            return '🌧️'  # Rain
-        elif self.precipitation > 0.1:
-            return '🌦️'  # Light rain
-        elif self.cloud_cover > 70:
-            return '☁️'  # Cloudy
-        elif self.cloud_cover > 30:
-            return '⛅'  # Partly cloudy
-        else:
-            return '☀️'  # Sunny
+        return _weather_icon(self.precipitation, self.cloud_cover)
 
     def to_dict(self) -> Dict[str, Any]:
         """Convert to dictionary
@@ -95,7 +174,11 @@ class ForecastItem:
 
 
 class Forecast:
-    """Forecast data object"""
+    """Forecast data object
+
+    Forecasts are treated as immutable: columns and derived variables are
+    memoized on first use and shared by every later caller.
+    """
 
     def __init__(self, result: Dict[str, Any], hours: int = 24):
         """Initialize Forecast object
@@ -112,6 +195,241 @@ class Forecast:
             ForecastItem.from_dict(item)
             for item in result['forecast'][:hours]
         ]
+        self._columns: Dict[str, List[Any]] = {}
+        self._source: Optional['Forecast'] = None
+
+    @classmethod
+    def _from_items(cls, latitude: float, longitude: float, grib2file_time: str,
+                    items: List[ForecastItem]) -> 'Forecast':
+        """Create Forecast from already decoded items"""
+        forecast = cls.__new__(cls)
+        forecast.latitude = latitude
+        forecast.longitude = longitude
+        forecast.grib2file_time = grib2file_time
+        forecast.data = items
+        forecast._columns = {}
+        forecast._source = None
+        return forecast
+
+    def to_bytes(self) -> bytes:
+        """Serialize to a compact, versioned binary format
+
+        Layout (little-endian):
+            header: magic, version, hours, latitude, longitude,
+                    start time (epoch seconds), grib2file_time length
+            grib2file_time (UTF-8, padded to 4 bytes)
+            int32 column of offsets from the start time (seconds)
+            uint8 scale per field in BINARY_FIELDS order (padded to 4 bytes)
+            one column per field in BINARY_FIELDS order: int32 values times
+            10**scale, or float64 when the scale is BINARY_FLOAT64
+
+        Each column uses the fewest decimals that reproduce all of its values,
+        so values round-trip exactly (restored as float).
+
+        Returns:
+            bytes: Serialized forecast
+
+        Raises:
+            ValueError: If an item datetime is not in BINARY_DATETIME_FORMAT
+        """
+        times = [
+            calendar.timegm(time.strptime(item.datetime, BINARY_DATETIME_FORMAT))
+            for item in self.data
+        ]
+        start = times[0] if times else 0
+        grib2file_time = self.grib2file_time.encode('utf-8')
+
+        offsets = array('i', [t - start for t in times])
+        scales = []
+        columns = []
+        for name in BINARY_FIELDS:
+            values = [getattr(item, name) for item in self.data]
+            decimals = _decimal_places(values)
+            if decimals is None:
+                scales.append(BINARY_FLOAT64)
+                columns.append(array('d', values))
+            else:
+                factor = 10 ** decimals
+                scales.append(decimals)
+                columns.append(array('i', [round(v * factor) for v in values]))
+        if sys.byteorder == 'big':
+            for column in [offsets] + columns:
+                column.byteswap()
+
+        parts = [
+            _BINARY_HEADER.pack(
+                BINARY_MAGIC, BINARY_VERSION, len(self.data),
+                self.latitude, self.longitude, start, len(grib2file_time)
+            ),
+            grib2file_time,
+            b'\0' * (-len(grib2file_time) % 4),
+            offsets.tobytes(),
+            bytes(scales),
+            b'\0' * (-len(scales) % 4),
+        ]
+        parts.extend(column.tobytes() for column in columns)
+        return b''.join(parts)
+
+    @classmethod
+    def from_bytes(cls, data) -> 'Forecast':
+        """Deserialize a forecast created by to_bytes()
+
+        Columns are read through memoryview casts of the input buffer,
+        so no intermediate copies of the payload are made.
+
+        Args:
+            data: bytes-like object (bytes, bytearray, memoryview, mmap)
+
+        Returns:
+            Forecast object
+
+        Raises:
+            ValueError: If the data is not a supported forecast payload
+        """
+        view = memoryview(data).cast('B')
+        if len(view) < _BINARY_HEADER.size:
+            raise ValueError("Truncated forecast payload")
+
+        magic, version, hours, latitude, longitude, start, grib_len = _BINARY_HEADER.unpack_from(view)
+        if magic != BINARY_MAGIC:
+            raise ValueError("Not a forecast payload")
+        if version != BINARY_VERSION:
+            raise ValueError(f"Unsupported forecast payload version: {version}")
+
+        pos = _BINARY_HEADER.size
+        grib2file_time = str(view[pos:pos + grib_len], 'utf-8')
+        pos += grib_len + (-grib_len % 4)
+
+        fields = len(BINARY_FIELDS)
+        scales_size = fields + (-fields % 4)
+        if len(view) < pos + 4 * hours + scales_size:
+            raise ValueError("Truncated forecast payload")
+
+        offsets = view[pos:pos + 4 * hours].cast('i')
+        if sys.byteorder == 'big':
+            offsets = array('i', offsets)
+            offsets.byteswap()
+        pos += 4 * hours
+        scales = bytes(view[pos:pos + fields])
+        pos += scales_size
+
+        columns = [offsets]
+        for scale in scales:
+            fmt, size = ('d', 8) if scale == BINARY_FLOAT64 else ('i', 4)
+            if scale != BINARY_FLOAT64 and scale > BINARY_MAX_DECIMALS:
+                raise ValueError(f"Invalid column scale: {scale}")
+            if len(view) < pos + size * hours:
+                raise ValueError("Truncated forecast payload")
+            if fmt == 'd':
+                # Copied since the column may not be 8-byte aligned
+                column = array('d')
+                column.frombytes(view[pos:pos + size * hours])
+            else:
+                column = view[pos:pos + size * hours].cast('i')
+            if sys.byteorder == 'big':
+                column = array(fmt, column)
+                column.byteswap()
+            if fmt == 'i':
+                factor = 10 ** scale
+                column = [value / factor for value in column]
+            columns.append(column)
+            pos += size * hours
+
+        items = [
+            ForecastItem(
+                time.strftime(BINARY_DATETIME_FORMAT, time.gmtime(start + offset)),
+                *values
+            )
+            for offset, *values in zip(*columns)
+        ]
+        return cls._from_items(latitude, longitude, grib2file_time, items)
+
+    def head(self, hours: int) -> 'Forecast':
+        """Get a forecast limited to the first hours
+
+        Args:
+            hours: Number of hours to keep
+
+        Returns:
+            Forecast object (self if it is already short enough)
+        """
+        if hours >= len(self.data):
+            return self
+        forecast = Forecast._from_items(self.latitude, self.longitude, self.grib2file_time, self.data[:hours])
+        # Derived values are per hour, so heads of a cached forecast share its memoized columns
+        forecast._source = self
+        return forecast
+
+    def _located(self, latitude: float, longitude: float, hours: int) -> 'Forecast':
+        """Get the first hours reported for another coordinate in the same grid cell"""
+        forecast = Forecast._from_items(latitude, longitude, self.grib2file_time, self.data[:hours])
+        forecast._source = self
+        return forecast
+
+    def column(self, name: str) -> List[Any]:
+        """Get a field of every item as one list (memoized)
+
+        Args:
+            name: ForecastItem field (e.g. 'temperature', 'datetime')
+
+        Returns:
+            List with one value per hour. It is shared; do not modify it
+        """
+        return self._memoized(name, lambda forecast: [getattr(item, name) for item in forecast.data])
+
+    def derived(self, name: str) -> List[Any]:
+        """Get a derived variable for every hour (memoized)
+
+        The variable is computed in one pass over the whole series on first
+        use. Available variables: see DERIVED_VARIABLES.
+
+        Args:
+            name: Derived variable name (e.g. 'dew_point', 'apparent_temperature')
+
+        Returns:
+            List with one value per hour. It is shared; do not modify it
+
+        Raises:
+            KeyError: If no derived variable is registered under name
+        """
+        return self._memoized('derived:' + name, DERIVED_VARIABLES[name])
+
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        """Convert all items to dictionaries (same keys as ForecastItem.to_dict)
+
+        The compass direction and weather icon come from the memoized
+        derived variables instead of being recomputed per item.
+
+        Returns:
+            list: One dictionary per hour
+        """
+        return [
+            {
+                'datetime': item.datetime,
+                'temperature': item.temperature,
+                'precipitation': item.precipitation,
+                'wind_speed': item.wind_speed,
+                'wind_direction': item.wind_direction,
+                'wind_direction_compass': compass,
+                'humidity': item.humidity,
+                'cloud_cover': item.cloud_cover,
+                'pressure': item.pressure,
+                'weather_icon': icon
+            }
+            for item, compass, icon in zip(
+                self.data, self.derived('wind_direction_compass'), self.derived('weather_icon')
+            )
+        ]
+
+    def _memoized(self, key: str, compute: Callable[['Forecast'], List[Any]]) -> List[Any]:
+        values = self._columns.get(key)
+        if values is None:
+            if self._source is not None:
+                values = self._source._memoized(key, compute)[:len(self.data)]
+            else:
+                values = compute(self)
+            self._columns[key] = values
+        return values
 
     def at(self, hour: int) -> Optional[ForecastItem]:
         """Get forecast item at specific hour
@@ -171,50 +489,324 @@ class Forecast:
         return self.data[index]
 
 
+@register_derived('wind_direction_compass')
+def _derive_compass(forecast: Forecast) -> List[str]:
+    """16-point compass direction the wind blows from"""
+    return [_compass(d) for d in forecast.column('wind_direction')]
+
+
+@register_derived('weather_icon')
+def _derive_weather_icon(forecast: Forecast) -> List[str]:
+    """Weather icon emoji"""
+    return [_weather_icon(p, c) for p, c in zip(forecast.column('precipitation'), forecast.column('cloud_cover'))]
+
+
+@register_derived('hour_of_day')
+def _derive_hour_of_day(forecast: Forecast) -> List[int]:
+    """Hour of the item datetime (0-23)"""
+    return [int(dt[11:13]) for dt in forecast.column('datetime')]
+
+
+@register_derived('wind_u')
+def _derive_wind_u(forecast: Forecast) -> List[float]:
+    """Eastward wind component (m/s)"""
+    return [-s * math.sin(math.radians(d))
+            for s, d in zip(forecast.column('wind_speed'), forecast.column('wind_direction'))]
+
+
+@register_derived('wind_v')
+def _derive_wind_v(forecast: Forecast) -> List[float]:
+    """Northward wind component (m/s)"""
+    return [-s * math.cos(math.radians(d))
+            for s, d in zip(forecast.column('wind_speed'), forecast.column('wind_direction'))]
+
+
+@register_derived('vapor_pressure')
+def _derive_vapor_pressure(forecast: Forecast) -> List[float]:
+    """Water vapour pressure (hPa)"""
+    return [rh / 100 * 6.105 * math.exp(17.27 * t / (237.7 + t))
+            for t, rh in zip(forecast.column('temperature'), forecast.column('humidity'))]
+
+
+@register_derived('dew_point')
+def _derive_dew_point(forecast: Forecast) -> List[float]:
+    """Dew point (°C, Magnus formula)"""
+    values = []
+    for t, rh in zip(forecast.column('temperature'), forecast.column('humidity')):
+        gamma = math.log(max(rh, 0.1) / 100) + 17.62 * t / (243.12 + t)
+        values.append(243.12 * gamma / (17.62 - gamma))
+    return values
+
+
+@register_derived('apparent_temperature')
+def _derive_apparent_temperature(forecast: Forecast) -> List[float]:
+    """Apparent temperature (°C, Steadman formula without radiation)"""
+    return [t + 0.33 * e - 0.70 * s - 4.00
+            for t, e, s in zip(forecast.column('temperature'), forecast.derived('vapor_pressure'),
+                               forecast.column('wind_speed'))]
+
+
+@register_derived('heat_index')
+def _derive_heat_index(forecast: Forecast) -> List[float]:
+    """Heat index (°C, NWS Rothfusz regression)"""
+    values = []
+    for t_c, rh in zip(forecast.column('temperature'), forecast.column('humidity')):
+        t = t_c * 9 / 5 + 32
+        hi = 0.5 * (t + 61.0 + (t - 68.0) * 1.2 + rh * 0.094)
+        if (hi + t) / 2 >= 80:
+            hi = (-42.379 + 2.04901523 * t + 10.14333127 * rh - 0.22475541 * t * rh
+                  - 0.00683783 * t * t - 0.05481717 * rh * rh + 0.00122874 * t * t * rh
+                  + 0.00085282 * t * rh * rh - 0.00000199 * t * t * rh * rh)
+            if rh < 13 and 80 <= t <= 112:
+                hi -= (13 - rh) / 4 * math.sqrt((17 - abs(t - 95)) / 17)
+            elif rh > 85 and 80 <= t <= 87:
+                hi += (rh - 85) / 10 * (87 - t) / 5
+        values.append((hi - 32) * 5 / 9)
+    return values
+
+
 class WeatherForecastClient:
     """WeatherForecast API Client"""
 
     API_BASE_URL = 'https://weather.ittools.biz/api/forecast/GSM'
+    MAX_FORECAST_HOURS = 172
+
+    # Hedging needs this many latency samples before it kicks in
+    HEDGE_MIN_SAMPLES = 20
+    # Base delay between retries (doubled on each retry)
+    RETRY_BACKOFF = 0.2
 
-    def __init__(self, api_token: str):
+    def __init__(self, api_token: str, cache=None, scheduler=None,
+                 timeout: float = 30.0, max_retries: int = 0, hedge: bool = False):
         """Initialize the client with an API token
 
         Args:
             api_token: Your weather API token
+            cache: Optional forecast cache (e.g. SharedForecastCache). When set,
+                forecasts are fetched once per grid cell at full length and
+                shared by every caller using the same cache
+            scheduler: RequestScheduler for upstream requests
+                (default: the scheduler shared by the whole process)
+            timeout: Timeout of a single HTTP request in seconds
+            max_retries: Retries on timeouts, connection errors, 429 and 5xx
+            hedge: Send a duplicate request when a response takes longer
+                than the observed p95 latency, and use whichever returns first
         """
         self.api_token = api_token
+        self.cache = cache
+        self.scheduler = scheduler or default_scheduler()
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.hedge = hedge
+
+        self._latencies: Deque[float] = deque(maxlen=200)
+        self._stats_lock = threading.Lock()
+        self._counters = {
+            'requests': 0, 'hedged': 0, 'hedge_wins': 0, 'retries': 0, 'deadline_exceeded': 0,
+            'interpolated': 0, 'interpolation_fallbacks': 0,
+        }
+        self._hedge_executor: Optional[ThreadPoolExecutor] = None
+        self._hedge_lock = threading.Lock()
 
-    def get_forecast(self, latitude: float, longitude: float, hours: int = 24) -> Forecast:
+    def get_forecast(self, latitude: float, longitude: float, hours: int = 24,
+                     priority: int = PRIORITY_INTERACTIVE, deadline: Optional[float] = None) -> Forecast:
         """Get weather forecast for a specific location
 
         Args:
             latitude: Latitude of the location
             longitude: Longitude of the location
             hours: Number of hours to forecast (default: 24, max: 172)
+            priority: Scheduler lane (PRIORITY_INTERACTIVE, PRIORITY_PREFETCH or PRIORITY_BULK)
+            deadline: Time budget in seconds shared by queueing, retries and hedges
 
         Returns:
             Forecast object containing weather data
 
         Raises:
+            DeadlineExceeded: If the deadline passes before a response arrives
             WeatherAPIError: If the API request fails
         """
-        url = f"{self.API_BASE_URL}/{self.api_token}/{latitude},{longitude}"
+        expires = None if deadline is None else time.monotonic() + deadline
+
+        if self.cache is None:
+            return self._fetch_forecast(latitude, longitude, hours, priority, expires)
+
+        # Cached forecasts are fetched for the grid point itself so that every
+        # coordinate in the cell shares one entry; the result still reports
+        # the requested coordinate, as an uncached request does
+        cell = grid_cell(latitude, longitude)
+        forecast = self.cache.get_or_fetch(
+            cell,
+            lambda: self._fetch_forecast(cell.latitude, cell.longitude, self.MAX_FORECAST_HOURS, priority, expires)
+        )
+        return forecast._located(latitude, longitude, hours)
+
+    def get_interpolated_forecast(self, latitude: float, longitude: float, hours: int = 24,
+                                  policy=None, priority: int = PRIORITY_INTERACTIVE,
+                                  deadline: Optional[float] = None) -> Forecast:
+        """Get a forecast interpolated from cached neighbouring grid points
+
+        Falls back to get_forecast() when the policy's accuracy requirements
+        cannot be met from the cache (or when the client has no cache).
+
+        Args:
+            latitude: Latitude of the location
+            longitude: Longitude of the location
+            hours: Number of hours to forecast (default: 24, max: 172)
+            policy: InterpolationPolicy (default: bilinear over all 4 neighbours)
+            priority: Scheduler lane used for the fallback fetch
+            deadline: Time budget in seconds for the fallback fetch
+
+        Returns:
+            Forecast object located at the requested coordinate
 
+        Raises:
+            WeatherAPIError: If the fallback request fails
+        """
         try:
-            response = requests.get(url, timeout=30)
-            response.raise_for_status()
+            from .interpolation import interpolate_from_cache
+        except ImportError:
+            from interpolation import interpolate_from_cache
+
+        if self.cache is not None:
+            forecast = interpolate_from_cache(self.cache, latitude, longitude, policy)
+            if forecast is not None:
+                self._count('interpolated')
+                return forecast.head(hours)
 
-            data = response.json()
+        self._count('interpolation_fallbacks')
+        return self.get_forecast(latitude, longitude, hours, priority, deadline)
 
-            if 'error' in data:
-                raise WeatherAPIError(data['error'])
+    def stats(self) -> Dict[str, float]:
+        """Get request, hedging and retry counters
 
-            if data.get('code') != 200:
-                raise WeatherAPIError(f"API Error: Code {data.get('code')}")
+        Returns:
+            dict: Counters plus hedge_rate (hedged / requests),
+                hedge_win_rate (hedge_wins / hedged) and latency_p95
+        """
+        with self._stats_lock:
+            stats: Dict[str, float] = dict(self._counters)
+        stats['hedge_rate'] = stats['hedged'] / stats['requests'] if stats['requests'] else 0.0
+        stats['hedge_win_rate'] = stats['hedge_wins'] / stats['hedged'] if stats['hedged'] else 0.0
+        stats['latency_p95'] = self._latency_p95() or 0.0
+        return stats
+
+    def _count(self, name: str) -> None:
+        with self._stats_lock:
+            self._counters[name] += 1
+
+    def _latency_p95(self) -> Optional[float]:
+        latencies = sorted(self._latencies)
+        if len(latencies) < self.HEDGE_MIN_SAMPLES:
+            return None
+        return latencies[int(len(latencies) * 0.95) - 1]
+
+    @staticmethod
+    def _remaining(expires: Optional[float]) -> Optional[float]:
+        if expires is None:
+            return None
+        remaining = expires - time.monotonic()
+        if remaining <= 0:
+            raise DeadlineExceeded("Deadline exceeded")
+        return remaining
+
+    def _fetch_forecast(self, latitude: float, longitude: float, hours: int, priority: int,
+                        expires: Optional[float] = None) -> Forecast:
+        """Request a forecast from the API, retrying within the deadline"""
+        # Imported on first use so that importing this module stays cheap
+        import requests
+        try:
+            from .json_codec import decode_forecast
+        except ImportError:
+            from json_codec import decode_forecast
 
-            return Forecast(data['result'], hours)
+        url = f"{self.API_BASE_URL}/{self.api_token}/{latitude},{longitude}"
+        self._count('requests')
+
+        attempt = 0
+        while True:
+            try:
+                response = self._request(url, priority, expires)
+                response.raise_for_status()
+
+                return decode_forecast(response.content, hours)
+
+            except DeadlineExceeded:
+                self._count('deadline_exceeded')
+                raise
+            except requests.exceptions.RequestException as e:
+                status = e.response.status_code if e.response is not None else None
+                retryable = status is None or status == 429 or status >= 500
+                delay = self.RETRY_BACKOFF * (2 ** attempt)
+
+                if not retryable or attempt >= self.max_retries:
+                    raise WeatherAPIError(f"Request failed: {str(e)}")
+                if expires is not None and time.monotonic() + delay >= expires:
+                    self._count('deadline_exceeded')
+                    raise DeadlineExceeded(f"Deadline exceeded after {attempt + 1} attempts: {str(e)}")
+
+                attempt += 1
+                self._count('retries')
+                time.sleep(delay)
+            except (KeyError, ValueError, TypeError) as e:
+                raise WeatherAPIError(f"Failed to parse response: {str(e)}")
+
+    def _request(self, url: str, priority: int, expires: Optional[float]):
+        """Send a request, hedging it when it runs past the p95 latency"""
+        hedge_after = self._latency_p95() if self.hedge else None
+        if hedge_after is None:
+            return self._attempt(url, priority, expires)
+
+        if self._hedge_executor is None:
+            with self._hedge_lock:
+                if self._hedge_executor is None:
+                    self._hedge_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix='weather-hedge')
+
+        primary = self._hedge_executor.submit(self._attempt, url, priority, expires)
+        remaining = self._remaining(expires)
+        done, _ = wait([primary], timeout=hedge_after if remaining is None else min(hedge_after, remaining))
+        if done:
+            return primary.result()
+
+        hedge = self._hedge_executor.submit(self._attempt, url, priority, expires)
+        self._count('hedged')
+
+        # A 429/5xx response only wins if the other request fails as well
+        error: Optional[BaseException] = None
+        error_response = None
+        try:
+            for future in as_completed([primary, hedge], timeout=self._remaining(expires)):
+                if future.exception() is not None:
+                    error = future.exception()
+                    continue
+                response = future.result()
+                if response.status_code >= 400:
+                    error_response = response
+                    continue
+                if future is hedge:
+                    self._count('hedge_wins')
+                return response
+        except FuturesTimeoutError:
+            if error_response is not None:
+                return error_response
+            raise DeadlineExceeded("Deadline exceeded")
+        if error_response is not None:
+            return error_response
+        raise error
+
+    def _attempt(self, url: str, priority: int, expires: Optional[float]):
+        """Send one HTTP request through the scheduler"""
+        import requests
 
-        except requests.exceptions.RequestException as e:
-            raise WeatherAPIError(f"Request failed: {str(e)}")
-        except (KeyError, ValueError) as e:
-            raise WeatherAPIError(f"Failed to parse response: {str(e)}")
+        try:
+            with self.scheduler.slot(priority, timeout=self._remaining(expires)) as slot:
+                remaining = self._remaining(expires)
+                started = time.monotonic()
+                response = requests.get(url, timeout=self.timeout if remaining is None else min(self.timeout, remaining))
+                slot.record(response.status_code, response.headers.get('Retry-After'))
+        except TimeoutError:
+            raise DeadlineExceeded("Deadline exceeded while waiting for a request slot")
+
+        if response.status_code < 400:
+            self._latencies.append(time.monotonic() - started)
+        return response
@@ -7,6 +7,10 @@ let selectedLocation = null;
 let latestForecastData = [];
 let latestGribTime = '';
 let selectedHours = CONFIG.FORECAST_HOURS;
+let forecastEvents = null;
+let tileManifest = null;
+let tileLayer = null;
+let tilePlayTimer = null;
 
 // 天気アイコンを決定する関数
 function getWeatherIcon(cloudCover, precipitation) {
@@ -69,6 +73,132 @@ function initMap() {
     console.log('✅ 地図の初期化が完了しました');
 }
 
+// 事前生成した予報マップタイルを読み込み、表示コントロールを用意
+async function initTileOverlay() {
+    if (!CONFIG.MAP_TILES) {
+        return;
+    }
+
+    try {
+        // latest.json だけは毎回確認し、マニフェストとタイルはブラウザのキャッシュを使う
+        const latestResponse = await fetch(`${CONFIG.TILES_URL}/latest.json`, { cache: 'no-cache' });
+        if (!latestResponse.ok) {
+            throw new Error(`HTTPエラー: ${latestResponse.status}`);
+        }
+        const latest = await latestResponse.json();
+
+        const manifestResponse = await fetch(`${CONFIG.TILES_URL}/${latest.manifest}`);
+        if (!manifestResponse.ok) {
+            throw new Error(`HTTPエラー: ${manifestResponse.status}`);
+        }
+        tileManifest = await manifestResponse.json();
+    } catch (error) {
+        console.log('ℹ️ 予報マップタイルはまだ作成されていません', error);
+        return;
+    }
+
+    const variableSelect = document.getElementById('tile-variable-select');
+    const hourRange = document.getElementById('tile-hour-range');
+    const playBtn = document.getElementById('tile-play-btn');
+
+    Object.entries(tileManifest.variables).forEach(([name, variable]) => {
+        const option = document.createElement('option');
+        option.value = name;
+        option.textContent = `${variable.label} (${variable.unit})`;
+        variableSelect.appendChild(option);
+    });
+
+    hourRange.max = String(tileManifest.hours.length - 1);
+    hourRange.value = '0';
+
+    variableSelect.addEventListener('change', updateTileOverlay);
+    hourRange.addEventListener('input', updateTileOverlay);
+    playBtn.addEventListener('click', toggleTilePlayback);
+
+    document.getElementById('tile-controls').classList.remove('hidden');
+    updateTileOverlay();
+
+    console.log(`✅ 予報マップタイルを読み込みました（実行: ${tileManifest.run}）`);
+}
+
+// 選択中の変数・予報時間のタイルを表示（時間送りはURLの切り替えだけで、APIへのリクエストは発生しない）
+function updateTileOverlay() {
+    const variable = document.getElementById('tile-variable-select').value;
+    const index = Number.parseInt(document.getElementById('tile-hour-range').value, 10);
+    const frame = tileManifest.hours[index];
+
+    document.getElementById('tile-hour-label').textContent = formatDateTime(frame.datetime);
+
+    if (!variable) {
+        stopTilePlayback();
+        if (tileLayer) {
+            map.removeLayer(tileLayer);
+            tileLayer = null;
+        }
+        renderTileLegend(null);
+        return;
+    }
+
+    const url = `${CONFIG.TILES_URL}/` + tileManifest.url
+        .replace('{variable}', variable)
+        .replace('{hour}', frame.hour);
+
+    if (tileLayer) {
+        tileLayer.setUrl(url);
+    } else {
+        tileLayer = L.tileLayer(url, {
+            bounds: tileManifest.bounds,
+            minNativeZoom: tileManifest.min_zoom,
+            maxNativeZoom: tileManifest.max_zoom,
+            attribution: 'Forecast tiles © ITtools Weather Service',
+        }).addTo(map);
+    }
+
+    renderTileLegend(tileManifest.variables[variable]);
+}
+
+function renderTileLegend(variable) {
+    const legendEl = document.getElementById('tile-legend');
+
+    if (!variable) {
+        legendEl.innerHTML = '';
+        return;
+    }
+
+    legendEl.innerHTML = variable.legend
+        .map(([value, color]) => `<span class="tile-legend-swatch" style="background: ${color}"></span>${value}`)
+        .join(' ') + ` ${variable.unit}`;
+}
+
+function toggleTilePlayback() {
+    if (tilePlayTimer) {
+        stopTilePlayback();
+        return;
+    }
+
+    const variableSelect = document.getElementById('tile-variable-select');
+    if (!variableSelect.value) {
+        variableSelect.value = Object.keys(tileManifest.variables)[0];
+    }
+
+    const hourRange = document.getElementById('tile-hour-range');
+    document.getElementById('tile-play-btn').textContent = '⏸';
+
+    tilePlayTimer = setInterval(() => {
+        hourRange.value = String((Number.parseInt(hourRange.value, 10) + 1) % tileManifest.hours.length);
+        updateTileOverlay();
+    }, 1000);
+    updateTileOverlay();
+}
+
+function stopTilePlayback() {
+    if (tilePlayTimer) {
+        clearInterval(tilePlayTimer);
+        tilePlayTimer = null;
+    }
+    document.getElementById('tile-play-btn').textContent = '▶';
+}
+
 function initControls() {
     const refreshBtn = document.getElementById('refresh-btn');
     const useLocationBtn = document.getElementById('use-location-btn');
@@ -201,6 +331,7 @@ async function fetchWeatherForecast(lat, lng) {
         latestGribTime = data.result.grib2file_time;
 
         renderCurrentForecast();
+        subscribeForecastUpdates(lat, lng);
 
     } catch (error) {
         console.error('❌ エラー:', error);
@@ -221,6 +352,77 @@ async function fetchWeatherForecast(lat, lng) {
     }
 }
 
+// 選択地点の予報更新を購読（新しいモデル実行が出たときだけプロキシからプッシュされる）
+function subscribeForecastUpdates(lat, lng) {
+    if (forecastEvents) {
+        forecastEvents.close();
+        forecastEvents = null;
+    }
+
+    if (!CONFIG.LIVE_UPDATES || !window.EventSource) {
+        return;
+    }
+
+    const url = `${CONFIG.EVENTS_API_URL}/${CONFIG.API_TOKEN}?points=${lat},${lng}`;
+    forecastEvents = new EventSource(url);
+
+    forecastEvents.addEventListener('forecast', (event) => {
+        const message = JSON.parse(event.data);
+        const result = message.data && message.data.result;
+
+        if (!result || message.grib2file_time === latestGribTime) {
+            return;
+        }
+
+        console.log(`🔔 新しい予報を受信しました: ${message.grib2file_time}`);
+        latestForecastData = result.forecast;
+        latestGribTime = result.grib2file_time;
+        renderCurrentForecast();
+    });
+}
+
+// 複数地点の天気予報をまとめて取得（NDJSONストリーミング）
+// points: [{ lat, lng, id }] / onResult: 1地点の結果が届くたびに呼ばれる
+async function fetchWeatherBatch(points, onResult) {
+    const url = `${CONFIG.API_BASE_URL}/${CONFIG.API_TOKEN}/batch`;
+
+    const response = await fetch(url, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ points }),
+    });
+
+    if (!response.ok) {
+        throw new Error(`HTTPエラー: ${response.status} ${response.statusText}`);
+    }
+
+    // 届いた行から順に処理する（全地点の完了を待たない）
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    while (true) {
+        const { done, value } = await reader.read();
+        if (done) {
+            break;
+        }
+
+        buffer += decoder.decode(value, { stream: true });
+        const lines = buffer.split('\n');
+        buffer = lines.pop();
+
+        for (const line of lines) {
+            if (line.trim()) {
+                onResult(JSON.parse(line));
+            }
+        }
+    }
+
+    if (buffer.trim()) {
+        onResult(JSON.parse(buffer));
+    }
+}
+
 function renderCurrentForecast() {
     if (!selectedLocation || latestForecastData.length === 0) {
         return;
@@ -503,5 +705,6 @@ document.addEventListener('DOMContentLoaded', () => {
     console.log('🚀 アプリケーションを起動しています...');
     initMap();
     initControls();
+    initTileOverlay();
     console.log('✅ アプリケーションの準備が完了しました');
 });
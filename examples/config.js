@@ -19,7 +19,17 @@ const CONFIG = {
     DEFAULT_ZOOM: 6,
 
     // 24時間予報のデータ数（1時間ごと）
-    FORECAST_HOURS: 24
+    FORECAST_HOURS: 24,
+
+    // 新しい予報のプッシュ配信（Server-Sent Events）を受け取る
+    // プロキシサーバー（server-proxy.py）使用時のみ有効
+    LIVE_UPDATES: true,
+    EVENTS_API_URL: '/api/events',
+
+    // 事前生成した予報マップタイル（気温・降水量・風速）を重ねて表示する
+    // プロキシサーバー（server-proxy.py）使用時のみ有効
+    MAP_TILES: true,
+    TILES_URL: '/tiles'
 };
 
 // APIトークンの検証
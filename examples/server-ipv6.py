@@ -7,6 +7,9 @@ IPv6対応のシンプルなHTTPサーバー
 
 デフォルトポート: 8000
 
+起動時にファイルを一度だけ読み込み、gzip圧縮版とETagを用意してメモリから配信します。
+ファイルを変更したら再起動してください（WEATHER_STATIC_CACHE=off で毎回ディスクから読み込みます）。
+
 アクセス方法:
     - ローカル: http://[::1]:8000
     - リンクローカル: http://[fe80::1234:5678:9abc:def0%eth0]:8000
@@ -14,19 +17,40 @@ IPv6対応のシンプルなHTTPサーバー
 """
 
 import http.server
+import os
 import socketserver
 import sys
 import socket
 
+import static_assets
+
 # ポート番号の取得
 PORT = int(sys.argv[1]) if len(sys.argv) > 1 else 8000
 
-class IPv6HTTPServer(socketserver.TCPServer):
-    """IPv6対応のHTTPサーバー"""
+# ファイルをメモリから配信するか（off でディスクから毎回読み込む）
+STATIC_CACHE = os.getenv('WEATHER_STATIC_CACHE', 'on') != 'off'
+
+class IPv6HTTPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    """IPv6対応のHTTPサーバー（接続ごとにスレッドで処理）"""
     address_family = socket.AF_INET6
     allow_reuse_address = True
+    daemon_threads = True
+
+store = static_assets.StaticAssetStore(os.getcwd()) if STATIC_CACHE else None
+
+class Handler(http.server.SimpleHTTPRequestHandler):
+    """メモリ上のファイルを持続的接続（HTTP/1.1）で配信するハンドラー"""
+    protocol_version = 'HTTP/1.1'
+    # 持続的接続で次のリクエストを待つ秒数
+    timeout = 30
+
+    def do_GET(self):
+        if store is None or not store.serve(self):
+            super().do_GET()
 
-Handler = http.server.SimpleHTTPRequestHandler
+    def do_HEAD(self):
+        if store is None or not store.serve(self, head=True):
+            super().do_HEAD()
 
 try:
     with IPv6HTTPServer(("", PORT), Handler) as httpd:
@@ -35,6 +59,9 @@ try:
         print("IPv6対応 HTTPサーバーを起動しました")
         print("=" * 60)
         print("\nポート: {}".format(PORT))
+        if store is not None:
+            print("配信ファイル: {} 件（メモリ上・gzip圧縮済み）".format(
+                len({id(asset) for asset in store.assets.values()})))
         print("\nアクセス方法:")
         print("  - ローカル (IPv6):     http://[::1]:{}".format(PORT))
         print("  - ローカル (IPv4):     http://127.0.0.1:{}".format(PORT))
@@ -6,19 +6,289 @@ CORS対応のプロキシサーバー
 """
 
 import http.server
+import math
 import socketserver
 import socket
 import urllib.request
 import urllib.error
-import json
+import os
+import queue
 import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from urllib.parse import urlparse, parse_qs
 
+# 親ディレクトリのclientsモジュールをインポートできるようにパスを追加
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from clients.python.grid import grid_cell
+from clients.python import json_codec
+from clients.python.scheduler import (
+    PRIORITY_INTERACTIVE, PRIORITY_PREFETCH, default_scheduler
+)
+
+import static_assets
+import tiles as map_tiles
+
 PORT = int(sys.argv[1]) if len(sys.argv) > 1 else 8000
 
+UPSTREAM_URL = "https://weather.ittools.biz/api/forecast/GSM/{}/{}"
+
+# バッチAPIで1リクエストに指定できる地点数の上限
+MAX_BATCH_POINTS = 1000
+# バッチAPIのリクエストボディの上限（バイト）
+MAX_BATCH_BODY_BYTES = 1024 * 1024
+
+# 事前生成したマップタイルの保存先と、タイル作成に使うAPIトークン（未設定なら作成しない）
+TILES_DIR = os.getenv('WEATHER_TILES_DIR', map_tiles.DEFAULT_TILES_DIR)
+TILES_TOKEN = os.getenv('WEATHER_TILES_TOKEN', '')
+# 実行ごとのディレクトリにあるタイルは内容が変わらないため長期間キャッシュさせる
+TILE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# フロントエンドのファイルをメモリから配信するか（off でディスクから毎回読み込む）
+STATIC_CACHE = os.getenv('WEATHER_STATIC_CACHE', 'on') != 'off'
+# 持続的接続（keep-alive）で次のリクエストを待つ秒数
+KEEPALIVE_TIMEOUT = 30
+
+# バッチAPI・更新配信で使うスレッド数（実際の同時リクエスト数はスケジューラーが調整）
+batch_executor = ThreadPoolExecutor(max_workers=32)
+
+
+def fetch_upstream(token, coords, priority=PRIORITY_INTERACTIVE):
+    """
+    天気予報APIからレスポンスボディを取得
+
+    リクエストは共有スケジューラーを経由し、429/5xxや遅延の増加に応じて
+    同時リクエスト数が調整されます。
+
+    Args:
+        token: APIトークン
+        coords: "緯度,経度" 形式の座標
+        priority: スケジューラーのレーン
+
+    Returns:
+        レスポンスボディ（bytes）
+    """
+    req = urllib.request.Request(
+        UPSTREAM_URL.format(token, coords),
+        headers={
+            'User-Agent': 'Mozilla/5.0 (Weather Forecast App)',
+            'Accept': 'application/json'
+        }
+    )
+
+    with default_scheduler().slot(priority) as slot:
+        try:
+            with urllib.request.urlopen(req, timeout=30) as response:
+                slot.record(response.status, response.headers.get('Retry-After'))
+                return response.read()
+        except urllib.error.HTTPError as e:
+            slot.record(e.code, e.headers.get('Retry-After'))
+            raise
+
+
+def parse_coordinate(lat, lng):
+    """
+    緯度・経度を数値に変換して範囲を確認
+
+    Returns:
+        (緯度, 経度)
+
+    Raises:
+        ValueError: 数値でない・有限でない・範囲外の場合
+    """
+    lat, lng = float(lat), float(lng)
+    if not (math.isfinite(lat) and math.isfinite(lng)):
+        raise ValueError('coordinates must be finite numbers')
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        raise ValueError('coordinates out of range: {},{}'.format(lat, lng))
+    return lat, lng
+
+
+def parse_batch_points(body):
+    """
+    バッチAPIのリクエストボディから地点リストを取り出す
+
+    受け付ける形式:
+        {"points": [[35.68, 139.65], {"lat": 34.69, "lng": 135.50, "id": "osaka"}, ...]}
+
+    Returns:
+        (id, 緯度, 経度) のリスト
+
+    Raises:
+        ValueError: 形式が不正な場合・座標が有限でないか範囲外の場合
+    """
+    request = json_codec.loads(body)
+    if not isinstance(request, dict):
+        raise ValueError('request body must be a JSON object')
+    points = request.get('points')
+    if not isinstance(points, list) or not points:
+        raise ValueError('points must be a non-empty list')
+    if len(points) > MAX_BATCH_POINTS:
+        raise ValueError('too many points (max {})'.format(MAX_BATCH_POINTS))
+
+    parsed = []
+    for index, point in enumerate(points):
+        if isinstance(point, dict):
+            point_id = point.get('id', index)
+            lat, lng = point['lat'], point['lng']
+        else:
+            point_id = index
+            lat, lng = point
+        parsed.append((point_id, *parse_coordinate(lat, lng)))
+    return parsed
+
+
+class ForecastHub:
+    """
+    格子点ごとの購読者を管理し、新しいモデル実行を検知したときだけ予報を配信するハブ
+
+    購読者が何人いても、アップストリームへの問い合わせは格子点ごとに1回/ポーリングです。
+    grib2file_time（モデル実行時刻）から次の実行までの間隔を見積もり、
+    新しい実行が出るまではポーリング間隔を広げます。
+    """
+
+    # GSMの実行間隔
+    RUN_INTERVAL = timedelta(hours=6)
+    # ポーリング間隔の下限・上限（秒）
+    MIN_POLL_INTERVAL = 600
+    MAX_POLL_INTERVAL = 3600
+    # SSE接続を維持するためのコメント送信間隔（秒）
+    HEARTBEAT_INTERVAL = 15
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # (token, cell) -> {'subscribers': set, 'grib2file_time': str, 'message': tuple, 'next_poll': float}
+        self.topics = {}
+        self.wakeup = threading.Event()
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def subscribe(self, token, cells):
+        """
+        格子点の更新を購読
+
+        Args:
+            token: APIトークン
+            cells: 購読する格子点のリスト
+
+        Returns:
+            更新が届くキュー（要素は (格子点, 予報データのJSON, grib2file_time)）
+        """
+        subscriber = queue.Queue()
+        with self.lock:
+            for cell in cells:
+                topic = self.topics.setdefault((token, cell), {
+                    'subscribers': set(), 'grib2file_time': None, 'message': None, 'next_poll': 0,
+                })
+                topic['subscribers'].add(subscriber)
+
+                # 取得済みの最新予報はすぐに届ける
+                if topic['message'] is not None:
+                    subscriber.put(topic['message'])
+
+        self.wakeup.set()
+        return subscriber
+
+    def unsubscribe(self, token, cells, subscriber):
+        """購読を解除（購読者がいなくなった格子点はポーリングを止める）"""
+        with self.lock:
+            for cell in cells:
+                topic = self.topics.get((token, cell))
+                if topic is None:
+                    continue
+                topic['subscribers'].discard(subscriber)
+                if not topic['subscribers']:
+                    del self.topics[(token, cell)]
+
+    def run(self):
+        """ポーリングループ"""
+        while True:
+            now = time.time()
+            with self.lock:
+                due = [key for key, topic in self.topics.items() if topic['next_poll'] <= now]
+                next_poll = min((topic['next_poll'] for topic in self.topics.values()), default=now + 60)
+
+            futures = {
+                batch_executor.submit(
+                    fetch_upstream, token, '{},{}'.format(cell.latitude, cell.longitude), PRIORITY_PREFETCH
+                ): (token, cell)
+                for token, cell in due
+            }
+            for future in as_completed(futures):
+                self.publish(*futures[future], future)
+
+            self.wakeup.wait(max(0, next_poll - time.time()) if not due else 0)
+            self.wakeup.clear()
+
+    def publish(self, token, cell, future):
+        """取得結果を確認し、モデル実行が進んでいれば購読者に配信"""
+        try:
+            result = json_codec.loads(future.result())
+            grib2file_time = result['result']['grib2file_time']
+        except Exception as e:
+            print("❌ 購読中の格子点の取得に失敗: {} ({})".format(cell.key(), e))
+            grib2file_time = None
+
+        with self.lock:
+            topic = self.topics.get((token, cell))
+            if topic is None:
+                return
+
+            topic['next_poll'] = time.time() + self.poll_delay(grib2file_time)
+            if grib2file_time is None or grib2file_time == topic['grib2file_time']:
+                return
+
+            topic['grib2file_time'] = grib2file_time
+            topic['message'] = (cell, json_codec.dumps(result), grib2file_time)
+            for subscriber in topic['subscribers']:
+                subscriber.put(topic['message'])
+
+        print("📣 新しい予報を配信: {} ({}) → {} 購読者".format(
+            cell.key(), grib2file_time, len(topic['subscribers'])))
+
+    def poll_delay(self, grib2file_time):
+        """次のポーリングまでの秒数（次のモデル実行が見込まれる時刻まで待つ）"""
+        try:
+            run_time = datetime.strptime(grib2file_time, '%Y%m%d%H%M%S').replace(tzinfo=timezone.utc)
+        except (TypeError, ValueError):
+            return self.MIN_POLL_INTERVAL
+
+        expected = (run_time + self.RUN_INTERVAL - datetime.now(timezone.utc)).total_seconds()
+        return min(max(expected, self.MIN_POLL_INTERVAL), self.MAX_POLL_INTERVAL)
+
+
+forecast_hub = ForecastHub()
+
+
+def run_tile_builder(token):
+    """
+    新しいモデル実行ごとにマップタイルを作成するループ
+
+    作成後は ForecastHub と同じ見積もりで次の実行が出るまで待ちます。
+    """
+    client = None
+    while True:
+        try:
+            # キャッシュファイルを開けない場合も、ログに残して次の見込み時刻に再試行する
+            if client is None:
+                client = map_tiles.create_client(token, os.getenv('WEATHER_FORECAST_CACHE'))
+            run = map_tiles.build_tiles(client, TILES_DIR)
+            run = map_tiles.run_id(run)
+        except Exception as e:
+            print("❌ マップタイルの作成に失敗: {}".format(e))
+            run = None
+        time.sleep(forecast_hub.poll_delay(run))
+
+
 class ProxyHandler(http.server.SimpleHTTPRequestHandler):
     """CORS対応のプロキシハンドラー"""
 
+    # 持続的接続に対応（ストリーミング以外のレスポンスは必ず Content-Length を返す）
+    protocol_version = 'HTTP/1.1'
+    timeout = KEEPALIVE_TIMEOUT
+
     def end_headers(self):
         """CORSヘッダーを追加"""
         self.send_header('Access-Control-Allow-Origin', '*')
@@ -29,18 +299,42 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
     def do_OPTIONS(self):
         """プリフライトリクエストに対応"""
         self.send_response(200)
+        self.send_header('Content-Length', '0')
         self.end_headers()
 
+    def do_POST(self):
+        """POSTリクエストの処理"""
+
+        # バッチAPI: /api/weather/{token}/batch
+        path_parts = self.path.split('/')
+        if self.path.startswith('/api/weather/') and len(path_parts) == 5 and path_parts[4] == 'batch':
+            self.handle_weather_batch(path_parts[3])
+        else:
+            # 読まなかったボディが次のリクエストと混ざらないよう接続を閉じる
+            self.close_connection = True
+            self.send_error(404, "Not Found")
+
     def do_GET(self):
         """GETリクエストの処理"""
 
+        # 事前生成したマップタイル
+        if self.path.startswith('/tiles/'):
+            self.handle_tiles()
+        # 更新通知（Server-Sent Events）
+        elif self.path.startswith('/api/events/'):
+            self.handle_forecast_events()
         # プロキシAPIパスの場合
-        if self.path.startswith('/api/weather/'):
+        elif self.path.startswith('/api/weather/'):
             self.handle_weather_api()
-        else:
+        elif static_store is None or not static_store.serve(self):
             # 通常のファイル配信
             super().do_GET()
 
+    def do_HEAD(self):
+        """HEADリクエストの処理"""
+        if static_store is None or not static_store.serve(self, head=True):
+            super().do_HEAD()
+
     def handle_weather_api(self):
         """天気予報APIへのプロキシリクエスト"""
         try:
@@ -55,59 +349,231 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
             coords = path_parts[4]
 
             # 天気予報APIにリクエスト
-            api_url = "https://weather.ittools.biz/api/forecast/GSM/{}/{}".format(token, coords)
-
-            print("📡 プロキシリクエスト: {}".format(api_url))
+            print("📡 プロキシリクエスト: {}".format(UPSTREAM_URL.format(token, coords)))
 
-            req = urllib.request.Request(
-                api_url,
-                headers={
-                    'User-Agent': 'Mozilla/5.0 (Weather Forecast App)',
-                    'Accept': 'application/json'
-                }
-            )
-
-            with urllib.request.urlopen(req, timeout=30) as response:
-                data = response.read()
+            data = fetch_upstream(token, coords)
 
-                # レスポンスを返す
-                self.send_response(200)
-                self.send_header('Content-Type', 'application/json; charset=utf-8')
-                self.end_headers()
-                self.wfile.write(data)
+            # レスポンスを返す
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
 
-                print("✅ プロキシ成功: {} bytes".format(len(data)))
+            print("✅ プロキシ成功: {} bytes".format(len(data)))
 
         except urllib.error.HTTPError as e:
             print("❌ HTTPエラー: {} {}".format(e.code, e.reason))
             self.send_response(e.code)
+            error_data = json_codec.encode({
+                'error': 'API Error: {} {}'.format(e.code, e.reason)
+            })
             self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(error_data)))
             self.end_headers()
-            error_data = json.dumps({
-                'error': 'API Error: {} {}'.format(e.code, e.reason)
-            }).encode()
             self.wfile.write(error_data)
 
         except urllib.error.URLError as e:
             print("❌ URLエラー: {}".format(e.reason))
             self.send_response(502)
+            error_data = json_codec.encode({
+                'error': 'Connection Error: {}'.format(e.reason)
+            })
             self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(error_data)))
             self.end_headers()
-            error_data = json.dumps({
-                'error': 'Connection Error: {}'.format(e.reason)
-            }).encode()
             self.wfile.write(error_data)
 
         except Exception as e:
             print("❌ エラー: {}".format(e))
             self.send_response(500)
+            error_data = json_codec.encode({
+                'error': 'Server Error: {}'.format(str(e))
+            })
             self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(error_data)))
             self.end_headers()
-            error_data = json.dumps({
-                'error': 'Server Error: {}'.format(str(e))
-            }).encode()
             self.wfile.write(error_data)
 
+    def handle_weather_batch(self, token):
+        """
+        複数地点の天気予報をNDJSONでストリーミング返却
+
+        同じ格子点に属する地点はアップストリームへ1回だけ問い合わせ、
+        取得が完了した格子点から順に1地点1行で書き出します。
+        """
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+        except ValueError:
+            length = -1
+        if not 0 <= length <= MAX_BATCH_BODY_BYTES:
+            # ボディは読まずに接続を閉じる
+            self.close_connection = True
+            self.send_json_error(413 if length > 0 else 400,
+                                 'Invalid batch request: body must be 0-{} bytes'.format(MAX_BATCH_BODY_BYTES))
+            return
+
+        try:
+            points = parse_batch_points(self.rfile.read(length))
+        except (ValueError, KeyError, TypeError) as e:
+            # 読み残したボディが次のリクエストと混ざらないよう接続を閉じる
+            self.close_connection = True
+            self.send_json_error(400, 'Invalid batch request: {}'.format(e))
+            return
+
+        # 格子点ごとに地点をまとめる
+        cells = {}
+        for index, (point_id, lat, lng) in enumerate(points):
+            cells.setdefault(grid_cell(lat, lng), []).append((index, point_id, lat, lng))
+
+        print("📡 バッチリクエスト: {} 地点 / {} 格子点".format(len(points), len(cells)))
+
+        futures = {
+            batch_executor.submit(
+                fetch_upstream, token, '{},{}'.format(cell.latitude, cell.longitude)
+            ): members
+            for cell, members in cells.items()
+        }
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson; charset=utf-8')
+        self.send_header('Cache-Control', 'no-cache')
+        # 長さが事前に分からないため、接続を閉じて終わりを伝える
+        self.send_header('Connection', 'close')
+        self.end_headers()
+
+        try:
+            for future in as_completed(futures):
+                try:
+                    data = future.result()
+                    if b'\n' in data:
+                        # NDJSONの1行に収めるため改行を含むJSONは詰めて再エンコード
+                        data = json_codec.encode(json_codec.loads(data))
+                    payload = b'"data":' + data
+                except urllib.error.HTTPError as e:
+                    payload = json_codec.encode({'error': 'API Error: {} {}'.format(e.code, e.reason)})[1:-1]
+                except urllib.error.URLError as e:
+                    payload = json_codec.encode({'error': 'Connection Error: {}'.format(e.reason)})[1:-1]
+                except Exception as e:
+                    payload = json_codec.encode({'error': 'Server Error: {}'.format(str(e))})[1:-1]
+
+                lines = []
+                for index, point_id, lat, lng in futures[future]:
+                    head = json_codec.encode({'index': index, 'id': point_id, 'lat': lat, 'lng': lng})
+                    lines.append(head[:-1] + b',' + payload + b'}\n')
+                self.wfile.write(b''.join(lines))
+                self.wfile.flush()
+
+            print("✅ バッチ完了: {} 地点".format(len(points)))
+
+        except (BrokenPipeError, ConnectionResetError, TimeoutError):
+            print("⚠️ クライアントが切断しました")
+            for future in futures:
+                future.cancel()
+
+    def handle_forecast_events(self):
+        """
+        格子点の予報更新をServer-Sent Eventsで配信
+
+        /api/events/{token}?points={lat},{lng};{lat},{lng}[&mode=notice]
+
+        新しいモデル実行（grib2file_time）が出たときだけ、各地点の予報を1回ずつ送ります。
+        mode=notice の場合は予報データを含まない変更通知だけを送ります。
+        """
+        url = urlparse(self.path)
+        path_parts = url.path.split('/')
+        query = parse_qs(url.query)
+
+        try:
+            token = path_parts[3]
+            points = {}
+            for pair in query['points'][0].split(';'):
+                values = pair.split(',')
+                if len(values) != 2:
+                    raise ValueError('invalid point: {}'.format(pair))
+                lat, lng = parse_coordinate(*values)
+                points.setdefault(grid_cell(lat, lng), []).append([lat, lng])
+            if len(points) > MAX_BATCH_POINTS:
+                raise ValueError('too many points (max {})'.format(MAX_BATCH_POINTS))
+        except (IndexError, KeyError, ValueError) as e:
+            self.send_json_error(400, 'Invalid events request: {}'.format(e))
+            return
+
+        notice_only = query.get('mode', ['full'])[0] == 'notice'
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream; charset=utf-8')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+
+        cells = list(points)
+        subscriber = forecast_hub.subscribe(token, cells)
+        print("🔔 購読開始: {} 格子点".format(len(cells)))
+
+        try:
+            while True:
+                try:
+                    cell, data, grib2file_time = subscriber.get(timeout=ForecastHub.HEARTBEAT_INTERVAL)
+                except queue.Empty:
+                    self.wfile.write(b': ping\n\n')
+                    self.wfile.flush()
+                    continue
+
+                head = json_codec.dumps({
+                    'points': points[cell],
+                    'grid': [cell.latitude, cell.longitude],
+                    'grib2file_time': grib2file_time,
+                })
+                body = head if notice_only else head[:-1] + ',"data":' + data + '}'
+                event = 'event: {}\nid: {}\ndata: {}\n\n'.format(
+                    'notice' if notice_only else 'forecast', grib2file_time, body)
+                self.wfile.write(event.encode('utf-8'))
+                self.wfile.flush()
+
+        except (BrokenPipeError, ConnectionResetError, TimeoutError):
+            pass
+        finally:
+            forecast_hub.unsubscribe(token, cells, subscriber)
+            print("🔕 購読終了: {} 格子点".format(len(cells)))
+
+    def handle_tiles(self):
+        """
+        事前生成したマップタイルを配信
+
+        /tiles/latest.json は実行が変わるたびに置き換わるため毎回確認させ、
+        実行ごとのディレクトリにあるマニフェストとタイルは immutable として配信します。
+        """
+        relative = urlparse(self.path).path[len('/tiles/'):]
+        root = os.path.realpath(TILES_DIR)
+        file_path = os.path.realpath(os.path.join(root, *relative.split('/')))
+
+        if not file_path.startswith(root + os.sep) or not os.path.isfile(file_path):
+            self.send_error(404, "Not Found")
+            return
+
+        with open(file_path, 'rb') as f:
+            data = f.read()
+
+        self.send_response(200)
+        if file_path.endswith('.png'):
+            self.send_header('Content-Type', 'image/png')
+        else:
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.send_header('Cache-Control', 'no-cache' if relative == 'latest.json' else TILE_CACHE_CONTROL)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_json_error(self, code, message):
+        """JSON形式のエラーレスポンスを返す"""
+        data = json_codec.encode({'error': message})
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
     def log_message(self, format, *args):
         """ログメッセージのカスタマイズ"""
         if not self.path.startswith('/api/weather/'):
@@ -116,11 +582,15 @@ class ProxyHandler(http.server.SimpleHTTPRequestHandler):
         super().log_message(format, *args)
 
 
-class IPv6TCPServer(socketserver.TCPServer):
-    """IPv6対応のTCPサーバー"""
+class IPv6TCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    """IPv6対応のTCPサーバー（リクエストごとにスレッドで処理）"""
     address_family = socket.AF_INET6
     allow_reuse_address = True
+    daemon_threads = True
+
 
+# 起動時に一度だけ読み込む（タイルは専用のハンドラーで配信）
+static_store = static_assets.StaticAssetStore(os.getcwd()) if STATIC_CACHE else None
 
 httpd = None
 try:
@@ -154,12 +624,22 @@ try:
     print("  ✓ 天気予報APIへのプロキシ")
     print("  ✓ CORS問題の自動解決")
     print("  ✓ IPv4/IPv6 両対応")
+    print("  ✓ 複数地点のバッチ取得")
+    print("  ✓ 新しい予報のプッシュ配信")
+    print("  ✓ 静的ファイルのメモリ配信（gzip・ETag・keep-alive）" if static_store else "  ✓ 静的ファイルの配信")
+    print("  ✓ 予報マップタイルの配信" + ("（自動作成あり）" if TILES_TOKEN else ""))
     print("\nAPIエンドポイント:")
     print("  /api/weather/{token}/{lat},{lng}")
+    print("  POST /api/weather/{token}/batch  (NDJSONストリーミング)")
+    print("  /api/events/{token}?points={lat},{lng};...  (Server-Sent Events)")
+    print("  /tiles/latest.json, /tiles/{run}/{variable}/{hour}/{z}/{x}/{y}.png")
     print("\n終了するには Ctrl+C を押してください")
     print("=" * 70)
     print()
 
+    if TILES_TOKEN:
+        threading.Thread(target=run_tile_builder, args=(TILES_TOKEN,), daemon=True).start()
+
     httpd.serve_forever()
 
 except KeyboardInterrupt:
@@ -0,0 +1,164 @@
+"""
+メモリ上の静的ファイル配信
+
+起動時にフロントエンドのファイル（index.html, app.js, config.js, style.css）を一度だけ読み込み、
+gzip圧縮版とETagを事前に作成してメモリから配信します。
+リクエストごとのファイルの stat・読み込み・圧縮は発生しません。
+読み込むのは STATIC_FILES のファイルだけです（タイルなどその他のファイルは通常どおりディスクから配信）。
+
+ファイルを変更した場合はサーバーを再起動してください。
+
+使い方:
+    store = StaticAssetStore(os.getcwd())
+
+    class Handler(http.server.SimpleHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            if not store.serve(self):
+                super().do_GET()
+"""
+
+import gzip
+import hashlib
+import mimetypes
+import os
+from email.utils import formatdate
+
+# メモリから配信するフロントエンドのファイル（配信ディレクトリ直下）
+STATIC_FILES = ('index.html', 'app.js', 'config.js', 'style.css')
+# 圧縮しても小さくならない形式
+PRECOMPRESSED_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.gif', '.webp', '.woff', '.woff2'}
+
+# これより小さいファイルは圧縮しない
+MIN_COMPRESS_SIZE = 1024
+
+# ファイルを変更したときに古い内容が使われないよう、ETagで毎回確認させる
+CACHE_CONTROL = 'no-cache'
+
+
+class StaticAsset:
+    """読み込み済みの静的ファイル"""
+
+    def __init__(self, file_path, content_type, etag, data, gzip_data=None):
+        self.file_path = file_path
+        self.content_type = content_type
+        self.etag = etag
+        self.data = data
+        self.gzip_data = gzip_data
+        # 圧縮版は内容が異なるため別のETagにする（強いETagは表現ごとに一意）
+        self.gzip_etag = etag[:-1] + '-gz"' if gzip_data is not None else None
+
+
+class StaticAssetStore:
+    """静的ファイルをメモリに読み込んで配信するストア"""
+
+    def __init__(self, root, files=STATIC_FILES):
+        """
+        Args:
+            root: 配信するディレクトリ
+            files: 読み込むファイル名（root 直下）
+        """
+        self.root = os.path.realpath(root)
+        self.files = tuple(files)
+        self.last_modified = formatdate(usegmt=True)
+        # URLパス -> StaticAsset
+        self.assets = {}
+        self.load()
+
+    def load(self):
+        """対象のファイルを読み込む（存在しないファイルは飛ばす）"""
+        assets = {}
+        for filename in self.files:
+            file_path = os.path.join(self.root, filename)
+            if not os.path.isfile(file_path):
+                continue
+            extension = os.path.splitext(filename)[1].lower()
+            assets['/' + filename] = self.load_asset(file_path, extension)
+
+        if '/index.html' in assets:
+            assets['/'] = assets['/index.html']
+        self.assets = assets
+
+    def load_asset(self, file_path, extension):
+        """1ファイルを読み込み、ETagと圧縮版を作成"""
+        content_type = mimetypes.guess_type(file_path)[0] or 'application/octet-stream'
+        if content_type.startswith('text/') or content_type in ('application/javascript', 'application/json'):
+            content_type += '; charset=utf-8'
+
+        with open(file_path, 'rb') as f:
+            data = f.read()
+        etag = '"{}"'.format(hashlib.blake2b(data, digest_size=16).hexdigest())
+
+        gzip_data = None
+        if len(data) >= MIN_COMPRESS_SIZE and extension not in PRECOMPRESSED_EXTENSIONS:
+            compressed = gzip.compress(data, compresslevel=9, mtime=0)
+            if len(compressed) < len(data):
+                gzip_data = compressed
+
+        return StaticAsset(file_path, content_type, etag, data, gzip_data)
+
+    def serve(self, handler, head=False):
+        """
+        リクエストされたファイルを配信
+
+        Args:
+            handler: BaseHTTPRequestHandler
+            head: HEADリクエストの場合はTrue（ボディを送らない）
+
+        Returns:
+            配信した場合はTrue、該当するファイルがない場合はFalse
+        """
+        path = handler.path.split('?', 1)[0].split('#', 1)[0]
+        asset = self.assets.get(path)
+        if asset is None:
+            return False
+
+        use_gzip = asset.gzip_data is not None and accepts_gzip(handler.headers.get('Accept-Encoding', ''))
+        etag = asset.gzip_etag if use_gzip else asset.etag
+
+        # 返す表現（gzip か非圧縮か）のETagとだけ比較する
+        if etag_matches(handler.headers.get('If-None-Match'), etag):
+            handler.send_response(304)
+            handler.send_header('ETag', etag)
+            handler.send_header('Cache-Control', CACHE_CONTROL)
+            if asset.gzip_data is not None:
+                handler.send_header('Vary', 'Accept-Encoding')
+            handler.end_headers()
+            return True
+
+        body = asset.gzip_data if use_gzip else asset.data
+
+        handler.send_response(200)
+        handler.send_header('Content-Type', asset.content_type)
+        handler.send_header('Content-Length', str(len(body)))
+        handler.send_header('ETag', etag)
+        handler.send_header('Last-Modified', self.last_modified)
+        handler.send_header('Cache-Control', CACHE_CONTROL)
+        if asset.gzip_data is not None:
+            handler.send_header('Vary', 'Accept-Encoding')
+        if use_gzip:
+            handler.send_header('Content-Encoding', 'gzip')
+        handler.end_headers()
+
+        if not head:
+            handler.wfile.write(body)
+        return True
+
+
+def accepts_gzip(accept_encoding):
+    """Accept-Encoding に gzip が含まれるか（q=0 は拒否）"""
+    for part in accept_encoding.split(','):
+        name, _, params = part.strip().partition(';')
+        if name.strip().lower() in ('gzip', '*'):
+            return params.replace(' ', '') not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000')
+    return False
+
+
+def etag_matches(if_none_match, etag):
+    """If-None-Match がETagに一致するか（弱い比較）"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    return etag in {tag.strip().removeprefix('W/') for tag in if_none_match.split(',')}
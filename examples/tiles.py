@@ -0,0 +1,509 @@
+#!/usr/bin/env python3
+"""
+予報マップタイルの事前生成
+
+モデル実行（grib2file_time）ごとに日本付近の粗い格子（陸地の周辺だけ）で予報を取得し、
+変数・予報時間ごとのXYZラスタタイル（PNG）を作成してディスクに保存します。
+タイルは実行ごとに別のディレクトリへ書き出すため一度作成した内容は変わらず、
+ブラウザに長期間キャッシュさせることができます。
+地図の表示・時間送りでアップストリームへのリクエストは発生しません。
+
+保存先:
+    tiles/latest.json                               最新の実行（短期キャッシュ）
+    tiles/{run}/manifest.json                       変数・予報時刻・ズーム範囲・凡例
+    tiles/{run}/{variable}/{hour}/{z}/{x}/{y}.png   タイル画像
+
+使い方:
+    python3 tiles.py --token your_api_token
+    python3 tiles.py --token your_api_token --hours 48 --max-zoom 7
+"""
+
+import argparse
+import json
+import math
+import os
+import shutil
+import struct
+import sys
+import zlib
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# 親ディレクトリのclientsモジュールをインポートできるようにパスを追加
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from clients.python.grid import grid_cell
+from clients.python.scheduler import PRIORITY_BULK
+from clients.python.weather_forecast_client import WeatherAPIError, WeatherForecastClient
+
+DEFAULT_TILES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tiles')
+
+# 対象範囲（南, 西, 北, 東）
+JAPAN_BOUNDS = (24.0, 122.0, 46.0, 146.0)
+
+# 予報を取得する陸地のおおまかな範囲（南, 西, 北, 東）。
+# 標本点はこの範囲から1間隔以内のものだけを取得し、外洋は描画しない（0.5度間隔で2205点 → 574点）
+JAPAN_LAND = (
+    (41.3, 139.3, 45.6, 145.9),  # 北海道
+    (37.0, 139.3, 41.6, 142.1),  # 東北
+    (34.5, 135.8, 38.0, 141.0),  # 関東・中部
+    (33.4, 130.8, 36.0, 136.9),  # 近畿・中国
+    (32.7, 132.0, 34.5, 134.8),  # 四国
+    (30.9, 129.4, 34.0, 132.1),  # 九州
+    (29.9, 129.9, 30.9, 131.1),  # 大隅諸島
+    (27.0, 128.3, 28.6, 130.1),  # 奄美群島
+    (26.0, 127.5, 27.0, 128.4),  # 沖縄本島
+    (24.0, 122.9, 25.0, 125.5),  # 先島諸島
+)
+
+TILE_SIZE = 256
+# 1色で塗る正方形の大きさ（ピクセル）。予報格子より十分細かい
+BLOCK_SIZE = 4
+
+# 変数ごとの描画設定（色は値の小さい順。範囲外の値は端の色で塗る）
+TILE_VARIABLES = {
+    'temperature': {
+        'label': '気温',
+        'unit': '°C',
+        'field': 'temperature',
+        'stops': [(-20, '#5e3c99'), (-5, '#2c7bb6'), (5, '#abd9e9'), (15, '#ffffbf'),
+                  (25, '#fdae61'), (35, '#d7191c')],
+    },
+    'precipitation': {
+        'label': '降水量',
+        'unit': 'mm/h',
+        'field': 'precipitation',
+        # これ未満は描画しない（透明）
+        'min_value': 0.1,
+        'stops': [(0.1, '#c6dbef'), (1, '#6baed6'), (5, '#2171b5'), (10, '#fdd835'),
+                  (20, '#fb8c00'), (50, '#c62828')],
+    },
+    'wind': {
+        'label': '風速',
+        'unit': 'm/s',
+        'field': 'wind_speed',
+        'stops': [(0, '#f7fcf5'), (5, '#a1d99b'), (10, '#41ab5d'), (15, '#fdae61'),
+                  (20, '#e31a1c'), (30, '#67000d')],
+    },
+}
+
+# パレットの色数（0番は透明）
+PALETTE_COLORS = 64
+OVERLAY_ALPHA = 170
+
+
+def build_palette(stops):
+    """
+    色の段階からパレットを作成
+
+    Returns:
+        (PLTEチャンクのデータ, tRNSチャンクのデータ)
+    """
+    colors = [(int(c[1:3], 16), int(c[3:5], 16), int(c[5:7], 16)) for _, c in stops]
+    palette = [(0, 0, 0)]
+    for i in range(PALETTE_COLORS):
+        position = i / (PALETTE_COLORS - 1) * (len(colors) - 1)
+        low = min(int(position), len(colors) - 2)
+        t = position - low
+        palette.append(tuple(round(a + (b - a) * t) for a, b in zip(colors[low], colors[low + 1])))
+
+    plte = b''.join(struct.pack('BBB', *rgb) for rgb in palette)
+    trns = bytes([0] + [OVERLAY_ALPHA] * PALETTE_COLORS)
+    return plte, trns
+
+
+def color_index(value, stops, min_value=None):
+    """値をパレット番号に変換（描画しない値は0）"""
+    if value is None or (min_value is not None and value < min_value):
+        return 0
+
+    # 色の段階の間は等間隔に割り当てる（降水量のように偏った目盛りでも色が分かれる）
+    values = [v for v, _ in stops]
+    if value <= values[0]:
+        return 1
+    if value >= values[-1]:
+        return PALETTE_COLORS
+    for i in range(len(values) - 1):
+        if value < values[i + 1]:
+            position = i + (value - values[i]) / (values[i + 1] - values[i])
+            return 1 + round(position / (len(values) - 1) * (PALETTE_COLORS - 1))
+    return PALETTE_COLORS
+
+
+def png_chunk(kind, data):
+    """PNGのチャンクを作成"""
+    return (struct.pack('>I', len(data)) + kind + data
+            + struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff))
+
+
+# パレット番号1つ分を BLOCK_SIZE ピクセルに引き延ばしたバイト列
+_BLOCK_BYTES = [bytes([i]) * BLOCK_SIZE for i in range(256)]
+
+
+def encode_png(blocks, plte, trns):
+    """
+    パレット番号のブロック配列をPNGにエンコード
+
+    Args:
+        blocks: 行ごとのパレット番号のリスト（TILE_SIZE / BLOCK_SIZE 四方）
+
+    Returns:
+        PNGのバイト列
+    """
+    raw = []
+    for row in blocks:
+        line = b'\x00' + b''.join(_BLOCK_BYTES[i] for i in row)
+        raw.append(line * BLOCK_SIZE)
+
+    header = struct.pack('>IIBBBBB', TILE_SIZE, TILE_SIZE, 8, 3, 0, 0, 0)
+    return (b'\x89PNG\r\n\x1a\n'
+            + png_chunk(b'IHDR', header)
+            + png_chunk(b'PLTE', plte)
+            + png_chunk(b'tRNS', trns)
+            + png_chunk(b'IDAT', zlib.compress(b''.join(raw), 6))
+            + png_chunk(b'IEND', b''))
+
+
+def tile_range(zoom, bounds=JAPAN_BOUNDS):
+    """範囲を覆うタイル番号 (x最小, x最大, y最小, y最大)"""
+    south, west, north, east = bounds
+    n = 2 ** zoom
+
+    def tile_x(lng):
+        return min(n - 1, int((lng + 180) / 360 * n))
+
+    def tile_y(lat):
+        lat = math.radians(lat)
+        return min(n - 1, int((1 - math.asinh(math.tan(lat)) / math.pi) / 2 * n))
+
+    return tile_x(west), tile_x(east), tile_y(north), tile_y(south)
+
+
+def sample_shape(step, bounds=JAPAN_BOUNDS):
+    """標本格子の (行数, 列数)"""
+    south, west, north, east = bounds
+    return int(round((north - south) / step)) + 1, int(round((east - west) / step)) + 1
+
+
+def near_land(lat, lng, margin, land=JAPAN_LAND):
+    """陸地の範囲から margin 度以内か"""
+    return any(
+        south - margin <= lat <= north + margin and west - margin <= lng <= east + margin
+        for south, west, north, east in land
+    )
+
+
+def sample_points(step, bounds=JAPAN_BOUNDS, land=JAPAN_LAND):
+    """予報を取得する標本格子の座標 (行, 列, 緯度, 経度)（land を指定すると陸地の周辺だけ）"""
+    south, west = bounds[0], bounds[1]
+    rows, cols = sample_shape(step, bounds)
+    points = [
+        (r, c, round(south + r * step, 6), round(west + c * step, 6))
+        for r in range(rows) for c in range(cols)
+    ]
+    if land is None:
+        return points
+    # 海岸付近を補間できるよう、陸地から1間隔以内の点まで含める
+    return [point for point in points if near_land(point[2], point[3], step, land)]
+
+
+class SampleGrid:
+    """標本格子上の予報。任意の座標の値を双線形補間で求める"""
+
+    def __init__(self, step, rows, cols, bounds=JAPAN_BOUNDS):
+        self.step = step
+        self.rows = rows
+        self.cols = cols
+        self.south, self.west = bounds[0], bounds[1]
+        # (行, 列) -> Forecast
+        self.forecasts = {}
+
+    def values(self, field, hour):
+        """ある予報時間の値を行ごとのリストで返す（欠測はNone）"""
+        grid = [[None] * self.cols for _ in range(self.rows)]
+        for (r, c), forecast in self.forecasts.items():
+            if hour < len(forecast.data):
+                grid[r][c] = getattr(forecast.data[hour], field)
+        return grid
+
+    def weights(self, position, size):
+        """格子上の位置を (左の番号, 右側の重み) に変換。範囲外はNone"""
+        if position < 0 or position > size - 1:
+            return None
+        low = min(int(position), size - 2)
+        return low, position - low
+
+    def tile_weights(self, zoom, x, y):
+        """タイル内の各ブロック中心の補間位置（全変数・全時間で共通なので1回だけ計算）"""
+        blocks = TILE_SIZE // BLOCK_SIZE
+        world = TILE_SIZE * 2 ** zoom
+
+        columns = []
+        for bx in range(blocks):
+            px = x * TILE_SIZE + bx * BLOCK_SIZE + BLOCK_SIZE / 2
+            lng = px / world * 360 - 180
+            columns.append(self.weights((lng - self.west) / self.step, self.cols))
+
+        rows = []
+        for by in range(blocks):
+            py = y * TILE_SIZE + by * BLOCK_SIZE + BLOCK_SIZE / 2
+            lat = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * py / world))))
+            rows.append(self.weights((lat - self.south) / self.step, self.rows))
+
+        return rows, columns
+
+
+def interpolate_tile(grid, rows, columns):
+    """タイル内の各ブロックの値を補間（欠測の角は除いて重みを正規化）"""
+    result = []
+    for row in rows:
+        if row is None:
+            result.append([None] * len(columns))
+            continue
+
+        r, fr = row
+        low, high = grid[r], grid[r + 1]
+        line = []
+        for column in columns:
+            if column is None:
+                line.append(None)
+                continue
+
+            c, fc = column
+            total = weight = 0.0
+            for value, w in ((low[c], (1 - fr) * (1 - fc)), (low[c + 1], (1 - fr) * fc),
+                             (high[c], fr * (1 - fc)), (high[c + 1], fr * fc)):
+                if value is not None:
+                    total += value * w
+                    weight += w
+            line.append(total / weight if weight > 0 else None)
+        result.append(line)
+    return result
+
+
+def fetch_samples(client, step, hours, workers, run=None, land=JAPAN_LAND):
+    """
+    標本格子の予報を取得
+
+    クライアントにキャッシュがあれば、実行 run の予報を保持している格子点は
+    （有効期限に関係なく）キャッシュの予報を使い、アップストリームには問い合わせません。
+    取得中にモデル実行が切り替わった場合に備え、最も多い実行の予報だけを使います。
+
+    Args:
+        client: WeatherForecastClient
+        step: 標本格子の間隔（度）
+        hours: 予報時間の長さ
+        workers: 同時に取得する地点数
+        run: 最新の実行の grib2file_time（キャッシュの再利用に使う）
+        land: 陸地の範囲（None なら範囲内の全点を取得）
+
+    Returns:
+        (SampleGrid, grib2file_time)
+
+    Raises:
+        WeatherAPIError: 1地点も取得できなかった場合
+    """
+    points = sample_points(step, land=land)
+    grid = SampleGrid(step, *sample_shape(step))
+    failures = 0
+
+    # 同じ実行の予報はキャッシュのエントリが古くても内容は変わらない
+    cache = getattr(client, 'cache', None)
+    pending = []
+    for r, c, lat, lng in points:
+        cached = None
+        if cache is not None and run is not None:
+            cached = cache.get(grid_cell(lat, lng), grib2file_time=run, max_age=math.inf)
+        if cached is not None:
+            grid.forecasts[(r, c)] = cached.head(hours)
+        else:
+            pending.append((r, c, lat, lng))
+    reused = len(grid.forecasts)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(client.get_forecast, lat, lng, hours, priority=PRIORITY_BULK): (r, c)
+            for r, c, lat, lng in pending
+        }
+        for future in as_completed(futures):
+            try:
+                grid.forecasts[futures[future]] = future.result()
+            except WeatherAPIError as e:
+                failures += 1
+                print("❌ 標本点の取得に失敗: {} ({})".format(futures[future], e))
+
+    if not grid.forecasts:
+        raise WeatherAPIError('No sample point could be fetched')
+
+    run, _ = Counter(f.grib2file_time for f in grid.forecasts.values()).most_common(1)[0]
+    grid.forecasts = {key: f for key, f in grid.forecasts.items() if f.grib2file_time == run}
+
+    print("📥 標本点 {} / {} 地点を取得（実行 {}、キャッシュ {}、失敗 {}）".format(
+        len(grid.forecasts), len(points), run, reused, failures))
+    return grid, run
+
+
+def render_run(grid, run_dir, hour_list, min_zoom, max_zoom):
+    """全変数・全予報時間・全ズームのタイルを書き出す"""
+    palettes = {name: build_palette(spec['stops']) for name, spec in TILE_VARIABLES.items()}
+    written = 0
+
+    # 補間位置はタイルごとに1回だけ計算し、全変数・全予報時間で使い回す
+    tiles = []
+    for zoom in range(min_zoom, max_zoom + 1):
+        x0, x1, y0, y1 = tile_range(zoom)
+        tiles.extend(
+            (zoom, x, y, grid.tile_weights(zoom, x, y))
+            for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)
+        )
+
+    for name, spec in TILE_VARIABLES.items():
+        for hour in hour_list:
+            values = grid.values(spec['field'], hour)
+            for zoom, x, y, (rows, columns) in tiles:
+                blocks = [
+                    [color_index(v, spec['stops'], spec.get('min_value')) for v in line]
+                    for line in interpolate_tile(values, rows, columns)
+                ]
+                # 全面が透明のタイルは作らない（地図側は範囲外として扱う）
+                if not any(any(line) for line in blocks):
+                    continue
+
+                path = os.path.join(run_dir, name, str(hour), str(zoom), str(x), '{}.png'.format(y))
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, 'wb') as f:
+                    f.write(encode_png(blocks, *palettes[name]))
+                written += 1
+
+    return written
+
+
+def run_id(grib2file_time):
+    """実行ディレクトリ名（grib2file_time の数字部分）"""
+    return ''.join(ch for ch in grib2file_time if ch.isdigit())
+
+
+def write_json(path, data):
+    """JSONを一時ファイル経由で置き換える（読み込み中のクライアントに途中の内容を見せない）"""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def build_tiles(client, tiles_dir=DEFAULT_TILES_DIR, hours=72, hour_step=3, min_zoom=4, max_zoom=6,
+                step=0.5, workers=8, keep=2, land=JAPAN_LAND):
+    """
+    最新のモデル実行のタイルを作成
+
+    作成済みの実行はスキップします。完成したタイルだけが見えるよう、
+    一時ディレクトリに書き出してから実行ディレクトリへ移し、最後に latest.json を更新します。
+
+    Args:
+        client: WeatherForecastClient
+        tiles_dir: 出力先ディレクトリ
+        hours: タイルを作る予報時間の長さ
+        hour_step: 予報時間の間隔
+        min_zoom: 最小ズームレベル
+        max_zoom: 最大ズームレベル
+        step: 標本格子の間隔（度）
+        workers: 同時に取得する地点数
+        keep: 残しておく実行の数（古い latest.json を持つクライアント向け）
+        land: 予報を取得する陸地の範囲（None なら範囲内の全点）
+
+    Returns:
+        作成（または作成済み）の実行の grib2file_time
+    """
+    # 範囲の中心1地点で最新の実行を確認し、作成済みなら標本格子の取得を省く
+    south, west, north, east = JAPAN_BOUNDS
+    probe = client.get_forecast((south + north) / 2, (west + east) / 2, 1, priority=PRIORITY_BULK)
+    if os.path.exists(os.path.join(tiles_dir, run_id(probe.grib2file_time), 'manifest.json')):
+        print("✅ 実行 {} のタイルは作成済みです".format(probe.grib2file_time))
+        return probe.grib2file_time
+
+    grid, run = fetch_samples(client, step, hours, workers, probe.grib2file_time, land)
+    run_dir = os.path.join(tiles_dir, run_id(run))
+    if os.path.exists(os.path.join(run_dir, 'manifest.json')):
+        return run
+
+    first = next(iter(grid.forecasts.values()))
+    hour_list = list(range(0, min(hours, len(first.data)), hour_step))
+
+    partial_dir = run_dir + '.partial'
+    shutil.rmtree(partial_dir, ignore_errors=True)
+    os.makedirs(partial_dir)
+
+    written = render_run(grid, partial_dir, hour_list, min_zoom, max_zoom)
+
+    write_json(os.path.join(partial_dir, 'manifest.json'), {
+        'run': run,
+        'bounds': [[south, west], [north, east]],
+        'min_zoom': min_zoom,
+        'max_zoom': max_zoom,
+        'hours': [{'hour': hour, 'datetime': first.data[hour].datetime} for hour in hour_list],
+        'variables': {
+            name: {
+                'label': spec['label'],
+                'unit': spec['unit'],
+                'legend': [[value, color] for value, color in spec['stops']],
+            }
+            for name, spec in TILE_VARIABLES.items()
+        },
+        'url': '{}/{{variable}}/{{hour}}/{{z}}/{{x}}/{{y}}.png'.format(run_id(run)),
+    })
+
+    shutil.rmtree(run_dir, ignore_errors=True)
+    os.rename(partial_dir, run_dir)
+    write_json(os.path.join(tiles_dir, 'latest.json'), {
+        'run': run, 'manifest': '{}/manifest.json'.format(run_id(run)),
+    })
+    print("🗺️ 実行 {} のタイルを {} 枚作成しました".format(run, written))
+
+    # 古い実行を削除
+    runs = sorted(
+        entry for entry in os.listdir(tiles_dir)
+        if entry.isdigit() and os.path.isdir(os.path.join(tiles_dir, entry))
+    )
+    for old in runs[:-keep]:
+        shutil.rmtree(os.path.join(tiles_dir, old), ignore_errors=True)
+
+    return run
+
+
+def create_client(token, cache_path=None):
+    """タイル作成用のクライアント（cache_path は WEATHER_FORECAST_CACHE と同じ指定: パス・'on'・'off'）"""
+    cache = None
+    if cache_path:
+        from clients.python.forecast_cache import SharedForecastCache, resolve_cache_path
+        path = resolve_cache_path(cache_path)
+        if path:
+            cache = SharedForecastCache(path)
+    return WeatherForecastClient(token, cache=cache, max_retries=2)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='予報マップタイルを作成')
+    parser.add_argument('--token', default=os.getenv('WEATHER_API_TOKEN', 'api_sample'),
+                        help='APIトークン（デフォルト: $WEATHER_API_TOKEN）')
+    parser.add_argument('-o', '--output', default=os.getenv('WEATHER_TILES_DIR', DEFAULT_TILES_DIR),
+                        help='出力先ディレクトリ（デフォルト: examples/tiles）')
+    parser.add_argument('--hours', type=int, default=72, help='予報時間の長さ（デフォルト: 72）')
+    parser.add_argument('--hour-step', type=int, default=3, help='予報時間の間隔（デフォルト: 3）')
+    parser.add_argument('--min-zoom', type=int, default=4, help='最小ズームレベル（デフォルト: 4）')
+    parser.add_argument('--max-zoom', type=int, default=6, help='最大ズームレベル（デフォルト: 6）')
+    parser.add_argument('--step', type=float, default=0.5, help='標本格子の間隔（度、デフォルト: 0.5）')
+    parser.add_argument('--workers', type=int, default=8, help='同時に取得する地点数（デフォルト: 8）')
+    parser.add_argument('--cache', default=os.getenv('WEATHER_FORECAST_CACHE', ''),
+                        help='共有キャッシュファイル（on で既定のファイル、off で無効。デフォルト: $WEATHER_FORECAST_CACHE、未指定なら使わない）')
+    parser.add_argument('--all-points', action='store_true',
+                        help='陸地の周辺だけでなく範囲内の全標本点（海上を含む）を取得')
+    args = parser.parse_args(argv)
+
+    client = create_client(args.token, args.cache)
+    build_tiles(client, args.output, args.hours, args.hour_step, args.min_zoom, args.max_zoom,
+                args.step, args.workers, land=None if args.all_points else JAPAN_LAND)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
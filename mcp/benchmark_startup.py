@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+MCPサーバーの起動時間ベンチマーク
+
+`python -X importtime` で server.py のインポート時間を計測し、予算を超えた場合や
+遅延読み込みすべきモジュールが起動時に読み込まれている場合は終了コード1で終了します。
+
+使い方:
+    python3 benchmark_startup.py [--budget-ms 400] [--runs 5] [--top 15]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+# 起動時に読み込まれてはいけないモジュール（初回使用時に遅延読み込みする）
+LAZY_MODULES = ('requests', 'city_coordinates', 'mcp.server.stdio')
+
+DEFAULT_BUDGET_MS = 400
+
+
+def measure_import(module: str = 'server') -> list[tuple[str, int, int]]:
+    """
+    新しいプロセスで module をインポートし、-X importtime の結果を返す
+
+    Args:
+        module: インポートするモジュール名
+
+    Returns:
+        (モジュール名, 自身の時間[us], 累積時間[us]) のリスト
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"{module} のインポートに失敗しました:\n{result.stderr}")
+
+    entries = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        entries.append((name.strip(), int(self_us), int(cumulative_us)))
+    return entries
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='MCPサーバーの起動時間ベンチマーク')
+    parser.add_argument('--budget-ms', type=float,
+                        default=float(os.getenv('WEATHER_MCP_STARTUP_BUDGET_MS', DEFAULT_BUDGET_MS)),
+                        help='server.py のインポート時間の予算（ミリ秒、中央値で判定）')
+    parser.add_argument('--runs', type=int, default=5, help='計測回数')
+    parser.add_argument('--top', type=int, default=15, help='表示する重いインポートの件数')
+    args = parser.parse_args()
+
+    totals = []
+    entries: list[tuple[str, int, int]] = []
+    for _ in range(args.runs):
+        entries = measure_import()
+        totals.append(next(cum for name, _, cum in entries if name == 'server') / 1000)
+
+    median_ms = statistics.median(totals)
+    print(f"server.py インポート時間: 中央値 {median_ms:.1f}ms "
+          f"(最小 {min(totals):.1f}ms / 最大 {max(totals):.1f}ms, {args.runs}回)")
+
+    print(f"\n自身の時間が長いモジュール（上位{args.top}件）:")
+    for name, self_us, cumulative_us in sorted(entries, key=lambda e: e[1], reverse=True)[:args.top]:
+        print(f"  {self_us / 1000:8.1f}ms  (累積 {cumulative_us / 1000:8.1f}ms)  {name}")
+
+    failed = False
+
+    loaded_lazy = sorted({name for name, _, _ in entries if name in LAZY_MODULES})
+    if loaded_lazy:
+        print(f"\n❌ 遅延読み込みすべきモジュールが起動時に読み込まれています: {', '.join(loaded_lazy)}")
+        failed = True
+
+    if median_ms > args.budget_ms:
+        print(f"\n❌ 予算 {args.budget_ms:.0f}ms を超えています")
+        failed = True
+
+    if not failed:
+        print(f"\n✅ 予算 {args.budget_ms:.0f}ms 以内です")
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
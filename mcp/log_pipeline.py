@@ -0,0 +1,166 @@
+"""
+MCPサーバー用のノンブロッキング・ログパイプライン
+
+ツール呼び出しの処理経路ではレコードをキューに積むだけにし、
+ファイル書き込み（サイズベースのローテーション付き）と標準エラー出力は
+バックグラウンドスレッドの QueueListener が担当します。
+
+- ファイルには1行1レコードのJSON（構造化ログ）を出力
+- 各レコードにリクエストIDとツール名を付与
+- 冗長なログ行（extra={'verbose': True}）はツールごとにサンプリング
+"""
+
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import uuid
+from datetime import datetime, timezone
+from typing import Optional
+
+# 現在処理中のリクエスト情報（asyncioタスクごとに独立）
+request_id_var: contextvars.ContextVar[str] = contextvars.ContextVar('request_id', default='-')
+tool_name_var: contextvars.ContextVar[str] = contextvars.ContextVar('tool_name', default='-')
+verbose_sampled_var: contextvars.ContextVar[bool] = contextvars.ContextVar('verbose_sampled', default=True)
+
+# LogRecordの標準属性（extraとして渡された項目と区別するため）
+_RESERVED_ATTRS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {
+    'message', 'asctime', 'request_id', 'tool', 'verbose'
+}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def begin_request(tool: str, sample_rates: Optional[dict[str, float]] = None,
+                  default_rate: float = 1.0) -> str:
+    """
+    ツール呼び出しの開始を記録し、リクエストIDを払い出す
+
+    冗長ログを出力するかどうかはリクエスト単位で一度だけ判定するため、
+    サンプリングされたリクエストの冗長ログは欠けずに揃って出力されます。
+
+    Args:
+        tool: ツール名
+        sample_rates: ツール名ごとの冗長ログのサンプリング率（0.0〜1.0）
+        default_rate: sample_rates に含まれないツールのサンプリング率
+
+    Returns:
+        払い出したリクエストID
+    """
+    request_id = uuid.uuid4().hex[:12]
+    rate = (sample_rates or {}).get(tool, default_rate)
+
+    request_id_var.set(request_id)
+    tool_name_var.set(tool)
+    verbose_sampled_var.set(rate >= 1.0 or random.random() < rate)
+    return request_id
+
+
+class RequestContextFilter(logging.Filter):
+    """
+    リクエストIDとツール名をレコードに付与し、冗長ログを間引くフィルター
+
+    キューに積む前（呼び出し元のタスク内）で評価されるため、
+    間引かれたレコードはキューにもディスクにも到達しません。
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if getattr(record, 'verbose', False) and not verbose_sampled_var.get():
+            return False
+
+        record.request_id = request_id_var.get()
+        record.tool = tool_name_var.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """1行1レコードのJSONを出力するフォーマッター"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'request_id': getattr(record, 'request_id', '-'),
+            'tool': getattr(record, 'tool', '-'),
+            'msg': record.getMessage(),
+        }
+
+        # extraで渡された構造化フィールドをそのまま出力
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED_ATTRS and not key.startswith('_'):
+                entry[key] = value
+
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """キューが満杯の場合はレコードを破棄するQueueHandler"""
+
+    dropped = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _NonBlockingQueueHandler.dropped += 1
+
+
+def setup_logging(
+    log_file: str,
+    level: int = logging.INFO,
+    max_bytes: int = 10 * 1024 * 1024,
+    backup_count: int = 5,
+    queue_size: int = 10000,
+) -> logging.handlers.QueueListener:
+    """
+    キュー経由でファイル・標準エラーに書き込むロギングを構成
+
+    Args:
+        log_file: ログファイルのパス
+        level: ログレベル
+        max_bytes: ローテーションするファイルサイズ（バイト）
+        backup_count: 保持する世代数
+        queue_size: キューの最大長（溢れたレコードは破棄し、呼び出し側を待たせない）
+
+    Returns:
+        起動済みの QueueListener
+    """
+    global _listener
+
+    if _listener is not None:
+        return _listener
+
+    file_handler = logging.handlers.RotatingFileHandler(
+        log_file, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8', delay=True
+    )
+    file_handler.setFormatter(JsonFormatter())
+
+    stream_handler = logging.StreamHandler(sys.stderr)
+    stream_handler.setFormatter(logging.Formatter(
+        '%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s'
+    ))
+
+    log_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+    queue_handler = _NonBlockingQueueHandler(log_queue)
+    queue_handler.addFilter(RequestContextFilter())
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+
+    _listener = logging.handlers.QueueListener(
+        log_queue, file_handler, stream_handler, respect_handler_level=True
+    )
+    _listener.start()
+    atexit.register(_listener.stop)
+    return _listener
@@ -0,0 +1,74 @@
+"""
+描画済みツール出力のキャッシュ
+
+同じ地点・同じモデル実行（grib2file_time）の予報は何度描画しても同じ結果になるため、
+フォーマット済みのテキストを保存して再利用します。
+サイズはバイト数で上限を設け、超えた場合は最も長く使われていないものから削除します（LRU）。
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Hashable, Optional
+
+
+class RenderCache:
+    """バイト数上限付きのLRUキャッシュ"""
+
+    def __init__(self, max_bytes: int = 8 * 1024 * 1024):
+        """
+        Args:
+            max_bytes: 保持する出力の合計サイズの上限（UTF-8換算のバイト数）
+        """
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[Hashable, tuple[str, int]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[str]:
+        """
+        キャッシュから出力を取得
+
+        Args:
+            key: キャッシュキー
+
+        Returns:
+            描画済みの出力、存在しない場合はNone
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, text: str) -> None:
+        """
+        出力をキャッシュに保存
+
+        Args:
+            key: キャッシュキー
+            text: 描画済みの出力
+        """
+        size = len(text.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old[1]
+
+            self._entries[key] = (text, size)
+            self.current_bytes += size
+
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+
+    def __len__(self) -> int:
+        return len(self._entries)
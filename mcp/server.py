@@ -5,48 +5,177 @@ Weather Forecast MCP Server
 MCPサーバーとして動作し、天気予報APIへのアクセスを提供します。
 """
 
+import asyncio
 import os
 import sys
+import functools
 import logging
 from typing import Any, Optional
-import json
 
 # 親ディレクトリのclientsモジュールをインポートできるようにパスを追加
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
 from mcp.server import Server
-from mcp.types import Tool, TextContent, ImageContent, EmbeddedResource
-import mcp.server.stdio
+from mcp.types import Tool, TextContent
 
+# requests・都市座標テーブル・ログのファイル出力などは初回使用時まで読み込まない
+# （ホストがセッションごとにサーバーを起動するため、起動時間がそのまま体感に影響する）
 from clients.python.weather_forecast_client import (
     WeatherForecastClient,
     WeatherAPIError,
     ForecastItem,
     Forecast
 )
-from city_coordinates import get_city_coordinates, get_available_cities, search_city
-
-# ログ設定
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(os.path.expanduser('~/.weather-mcp.log')),
-        logging.StreamHandler(sys.stderr)
-    ]
-)
+from clients.python.grid import grid_cell
+from clients.python import json_codec
+from log_pipeline import setup_logging, begin_request
+from render_cache import RenderCache
+
 logger = logging.getLogger('weather-mcp')
 
+
+def parse_sample_rate(value: str, source: str) -> Optional[float]:
+    """
+    サンプリング率を解析（0〜1に丸める）
+
+    Args:
+        value: 設定値
+        source: 警告に表示する設定の名前
+
+    Returns:
+        サンプリング率。不正な値の場合はNone（警告を出して無視）
+    """
+    try:
+        rate = float(value)
+    except ValueError:
+        logger.warning("Ignoring invalid log sample rate for %s: %r", source, value)
+        return None
+    if rate != rate:  # NaN
+        logger.warning("Ignoring invalid log sample rate for %s: %r", source, value)
+        return None
+    return min(1.0, max(0.0, rate))
+
+
+def parse_sample_rates(spec: str) -> dict[str, float]:
+    """
+    "ツール名=率,ツール名=率" 形式の設定を解析（不正な項目は警告を出して無視）
+    """
+    rates = {}
+    for entry in spec.split(','):
+        if not entry.strip():
+            continue
+        tool, sep, value = entry.partition('=')
+        if not sep or not tool.strip():
+            logger.warning("Ignoring invalid WEATHER_MCP_LOG_SAMPLE entry: %r", entry)
+            continue
+        rate = parse_sample_rate(value.strip(), tool.strip())
+        if rate is not None:
+            rates[tool.strip()] = rate
+    return rates
+
+
+def env_number(name: str, default, convert=float, minimum=None):
+    """
+    数値の環境変数を読み込む（不正な値は警告を出してデフォルト値を使う）
+
+    Args:
+        name: 環境変数名
+        default: 未設定・不正な場合の値
+        convert: 変換関数（int または float）
+        minimum: 許容する最小値
+
+    Returns:
+        変換した値
+    """
+    value = os.getenv(name)
+    if value is None or not value.strip():
+        return default
+    try:
+        number = convert(value)
+    except ValueError:
+        number = None
+    if number is None or number != number or (minimum is not None and number < minimum):
+        logger.warning("Ignoring invalid %s: %r (using %s)", name, value, default)
+        return default
+    return number
+
+
+# 冗長ログ（引数の詳細など）のサンプリング率
+# 例: WEATHER_MCP_LOG_SAMPLE="get_weather_forecast=0.1,get_weather_by_city=0.1"
+LOG_SAMPLE_DEFAULT = parse_sample_rate(
+    os.getenv('WEATHER_MCP_LOG_SAMPLE_DEFAULT', '1.0'), 'WEATHER_MCP_LOG_SAMPLE_DEFAULT'
+)
+if LOG_SAMPLE_DEFAULT is None:
+    LOG_SAMPLE_DEFAULT = 1.0
+LOG_SAMPLE_RATES = parse_sample_rates(os.getenv('WEATHER_MCP_LOG_SAMPLE', ''))
+
 # MCPサーバーインスタンス
 app = Server("weather-forecast-mcp")
 
 # APIトークンを環境変数から取得
 API_TOKEN = os.getenv('WEATHER_API_TOKEN', 'api_sample')
-if API_TOKEN == 'api_sample':
-    logger.warning('⚠️ サンプルトークンを使用しています。環境変数 WEATHER_API_TOKEN を設定してください。')
 
-# Weather APIクライアント
-weather_client = WeatherForecastClient(API_TOKEN)
+# 描画済み出力のキャッシュ（get_weather_forecast / get_weather_by_city で共有）
+render_cache = RenderCache(env_number('WEATHER_MCP_RENDER_CACHE_BYTES', 8 * 1024 * 1024, int, minimum=0))
+
+# ツール呼び出し1回あたりの上流リクエストの時間予算（秒）。待機・リトライ・ヘッジすべてを含む
+TOOL_DEADLINE = env_number('WEATHER_MCP_DEADLINE', 15.0, minimum=0.001)
+
+# check_weather_alerts で使うルールの表示名（ルール定義は clients/python/rules.py の PRESET_RULES）
+ALERT_RULE_LABELS = {
+    'heavy_rain': '大雨（3時間雨量30mm以上）',
+    'intense_rain': '強い雨（1時間雨量20mm以上）',
+    'strong_wind': '強風（風速15m/s以上）',
+    'overnight_frost': '夜間の氷点下（18時〜6時に0°C未満）',
+    'heat_stress': '暑さ（暑さ指数32°C以上）',
+}
+
+# Weather APIクライアント（get_weather_client() で初回使用時に生成）
+_weather_client: Optional[WeatherForecastClient] = None
+
+
+def configure_logging() -> None:
+    """
+    ログ設定（ファイル書き込みはバックグラウンドスレッドで実行）
+    """
+    setup_logging(
+        os.getenv('WEATHER_MCP_LOG_FILE', os.path.expanduser('~/.weather-mcp.log')),
+        level=getattr(logging, os.getenv('WEATHER_MCP_LOG_LEVEL', 'INFO').upper(), logging.INFO),
+        max_bytes=env_number('WEATHER_MCP_LOG_MAX_BYTES', 10 * 1024 * 1024, int, minimum=0),
+        backup_count=env_number('WEATHER_MCP_LOG_BACKUPS', 5, int, minimum=0),
+    )
+
+
+def get_weather_client() -> WeatherForecastClient:
+    """
+    Weather APIクライアントを取得（初回呼び出し時に生成）
+    """
+    global _weather_client
+
+    if _weather_client is None:
+        # 同じホスト上のMCPサーバー間で予報を共有するキャッシュ
+        # （WEATHER_FORECAST_CACHE にファイルのパス、または "on" を指定した場合だけ使用）
+        cache = None
+        cache_setting = os.getenv('WEATHER_FORECAST_CACHE', '')
+        if cache_setting:
+            from clients.python.forecast_cache import SharedForecastCache, resolve_cache_path
+            cache_path = resolve_cache_path(cache_setting)
+            if cache_path:
+                try:
+                    cache = SharedForecastCache(
+                        cache_path, ttl=env_number('WEATHER_FORECAST_CACHE_TTL', 600.0, minimum=0)
+                    )
+                except (OSError, ValueError) as e:
+                    logger.warning("Shared forecast cache disabled: %s", e)
+
+        _weather_client = WeatherForecastClient(
+            API_TOKEN,
+            cache=cache,
+            max_retries=env_number('WEATHER_MCP_RETRIES', 2, int, minimum=0),
+            # ヘッジは遅い呼び出しの上流負荷を最大2倍にするため、明示的に有効化した場合だけ使う
+            hedge=os.getenv('WEATHER_MCP_HEDGE', '0') == '1',
+        )
+    return _weather_client
 
 
 def format_forecast_summary(forecast: Forecast, city_name: Optional[str] = None) -> str:
@@ -72,9 +201,9 @@ def format_forecast_summary(forecast: Forecast, city_name: Optional[str] = None)
     lines.append(f"📅 データ生成時刻: {forecast.grib2file_time}")
     lines.append(f"⏰ 予報時間数: {len(forecast)}時間\n")
 
-    # サマリー統計
-    temps = [item.temperature for item in forecast]
-    precips = [item.precipitation for item in forecast]
+    # サマリー統計（列・派生変数は予報ごとに1回だけ計算される）
+    temps = forecast.column('temperature')
+    precips = forecast.column('precipitation')
     rainy_hours = len([p for p in precips if p > 0.1])
 
     lines.append("## 概要")
@@ -87,10 +216,10 @@ def format_forecast_summary(forecast: Forecast, city_name: Optional[str] = None)
     display_hours = min(24, len(forecast))
     lines.append(f"## {display_hours}時間予報\n")
 
-    for i, item in enumerate(forecast.data[:display_hours]):
-        icon = item.weather_icon()
-        wind_dir = item.wind_direction_compass()
+    icons = forecast.derived('weather_icon')
+    wind_dirs = forecast.derived('wind_direction_compass')
 
+    for item, icon, wind_dir in zip(forecast.data[:display_hours], icons, wind_dirs):
         line = (
             f"{item.datetime} {icon} "
             f"気温:{item.temperature:.1f}°C "
@@ -116,8 +245,8 @@ def format_forecast_json(forecast: Forecast, city_name: Optional[str] = None) ->
     Returns:
         JSON形式の予報データ
     """
-    temps = [item.temperature for item in forecast]
-    precips = [item.precipitation for item in forecast]
+    temps = forecast.column('temperature')
+    precips = forecast.column('precipitation')
     rainy_hours = len([p for p in precips if p > 0.1])
 
     result = {
@@ -126,7 +255,7 @@ def format_forecast_json(forecast: Forecast, city_name: Optional[str] = None) ->
             "longitude": forecast.longitude,
         },
         "data_time": forecast.grib2file_time,
-        "forecast": [item.to_dict() for item in forecast.data],
+        "forecast": forecast.to_dicts(),
         "summary": {
             "max_temp": max(temps),
             "min_temp": min(temps),
@@ -142,10 +271,93 @@ def format_forecast_json(forecast: Forecast, city_name: Optional[str] = None) ->
     return result
 
 
-@app.list_tools()
-async def list_tools() -> list[Tool]:
+def render_forecast(forecast: Forecast, output_format: str,
+                    city_name: Optional[str] = None) -> str:
     """
-    利用可能なツールのリストを返す
+    予報をツール出力の形式に描画（描画済みの出力があれば再利用）
+
+    キャッシュキーは出力に含まれるデータそのもの
+    (都市名, 緯度, 経度, 格子点, 予報時間数, 出力形式, grib2file_time) です。
+    ツール名は含めないため、同じデータならどのツールの呼び出しでも再利用されます。
+
+    Args:
+        forecast: Forecast オブジェクト
+        output_format: 出力形式（'text' または 'json'）
+        city_name: 都市名（オプション）
+
+    Returns:
+        描画済みの出力
+    """
+    cell = grid_cell(forecast.latitude, forecast.longitude)
+    key = (city_name, forecast.latitude, forecast.longitude, cell.row, cell.col,
+           len(forecast), output_format, forecast.grib2file_time)
+
+    text = render_cache.get(key)
+    if text is not None:
+        return text
+
+    if output_format == "json":
+        result = format_forecast_json(forecast, city_name)
+        text = json_codec.dumps(result, indent=True)
+    else:
+        text = format_forecast_summary(forecast, city_name)
+
+    render_cache.put(key, text)
+    return text
+
+
+@functools.lru_cache(maxsize=32)
+def get_alert_rules(rule_names: tuple[str, ...]):
+    """
+    ルールの組み合わせごとにコンパイル済みのルールセットを取得（同じ組み合わせは再コンパイルしない）
+    """
+    from clients.python.rules import PRESET_RULES, RuleSet
+
+    return RuleSet(PRESET_RULES[name] for name in rule_names)
+
+
+def format_alerts(events: list, failures: dict[str, str], cities: list[str], hours: int) -> str:
+    """
+    発生したアラートを都市ごとにまとめたテキストにフォーマット
+
+    Args:
+        events: AlertEvent のリスト
+        failures: 取得に失敗した都市とエラー内容
+        cities: 確認した都市
+        hours: 確認した予報時間数
+
+    Returns:
+        フォーマットされた文字列
+    """
+    lines = [f"# 気象アラート（{len(cities)}都市・{hours}時間先まで）"]
+
+    if not events:
+        lines.append("\n該当するアラートはありません。")
+
+    by_city: dict[str, list] = {}
+    for event in events:
+        by_city.setdefault(event.site, []).append(event)
+
+    for city, city_events in by_city.items():
+        lines.append(f"\n## {city}")
+        for event in city_events:
+            label = ALERT_RULE_LABELS.get(event.rule, event.rule)
+            lines.append(f"⚠️ {label}: {event.start} 〜 {event.end}（{event.hours}時間、ピーク {event.peak:.1f}）")
+
+    if failures:
+        lines.append("\n## 取得できなかった都市")
+        for city, error in failures.items():
+            lines.append(f"- {city}: {error}")
+
+    return "\n".join(lines)
+
+
+@functools.cache
+def build_tools() -> list[Tool]:
+    """
+    ツール定義（静的なスキーマ）を生成
+
+    内容は起動中に変化しないため、初回呼び出し時に一度だけ生成して使い回します。
     """
     return [
         Tool(
@@ -243,17 +455,64 @@ async def list_tools() -> list[Tool]:
                 },
                 "required": ["query"]
             }
+        ),
+        Tool(
+            name="check_weather_alerts",
+            description=(
+                "複数の都市の予報に対して、大雨・強風・夜間の氷点下などのしきい値ルールをまとめて確認します。"
+                "条件を満たした都市・ルール・時間帯だけを返します。"
+            ),
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "cities": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "確認する都市名のリスト（省略時は利用可能なすべての都市）"
+                    },
+                    "rules": {
+                        "type": "array",
+                        "items": {"type": "string", "enum": list(ALERT_RULE_LABELS)},
+                        "description": "確認するルール（省略時はすべて）: " + "、".join(
+                            f"{name}={label}" for name, label in ALERT_RULE_LABELS.items()
+                        )
+                    },
+                    "hours": {
+                        "type": "integer",
+                        "description": "確認する予報時間数（デフォルト: 48、最大: 172）",
+                        "default": 48,
+                        "minimum": 1,
+                        "maximum": 172
+                    },
+                    "format": {
+                        "type": "string",
+                        "description": "出力形式（'text' または 'json'、デフォルト: 'text'）",
+                        "enum": ["text", "json"],
+                        "default": "text"
+                    }
+                }
+            }
         )
     ]
 
 
+@app.list_tools()
+async def list_tools() -> list[Tool]:
+    """
+    利用可能なツールのリストを返す
+    """
+    return build_tools()
+
+
 @app.call_tool()
 async def call_tool(name: str, arguments: Any) -> list[TextContent]:
     """
     ツールを実行
     """
     try:
-        logger.info(f"Tool called: {name} with arguments: {arguments}")
+        begin_request(name, LOG_SAMPLE_RATES, LOG_SAMPLE_DEFAULT)
+        logger.info("Tool called: %s", name)
+        logger.info("Tool arguments: %s", arguments, extra={'verbose': True})
 
         if name == "get_weather_forecast":
             return await handle_get_weather_forecast(arguments)
@@ -267,12 +526,15 @@ async def call_tool(name: str, arguments: Any) -> list[TextContent]:
         elif name == "search_cities":
             return await handle_search_cities(arguments)
 
+        elif name == "check_weather_alerts":
+            return await handle_check_weather_alerts(arguments)
+
         else:
-            logger.error(f"Unknown tool: {name}")
+            logger.error("Unknown tool: %s", name)
             return [TextContent(type="text", text=f"エラー: 不明なツール '{name}'")]
 
     except Exception as e:
-        logger.exception(f"Error in tool {name}: {e}")
+        logger.exception("Error in tool %s: %s", name, e)
         return [TextContent(type="text", text=f"エラーが発生しました: {str(e)}")]
 
 
@@ -286,24 +548,27 @@ async def handle_get_weather_forecast(arguments: dict[str, Any]) -> list[TextCon
     output_format = arguments.get("format", "text")
 
     try:
-        logger.info(f"Fetching forecast for lat={latitude}, lng={longitude}, hours={hours}")
+        logger.info(
+            "Fetching forecast for lat=%s, lng=%s, hours=%s", latitude, longitude, hours,
+            extra={'verbose': True}
+        )
 
-        forecast = weather_client.get_forecast(latitude, longitude, hours)
+        # 上流リクエストは共有スケジューラーの interactive レーンで実行（待機中もイベントループを止めない）
+        forecast = await asyncio.to_thread(
+            get_weather_client().get_forecast, latitude, longitude, hours, deadline=TOOL_DEADLINE
+        )
 
-        if output_format == "json":
-            result = format_forecast_json(forecast)
-            text = json.dumps(result, ensure_ascii=False, indent=2)
-        else:
-            text = format_forecast_summary(forecast)
+        text = render_forecast(forecast, output_format)
 
-        logger.info(f"Forecast retrieved successfully: {len(forecast)} hours")
+        logger.info("Forecast retrieved successfully: %d hours", len(forecast))
+        logger.info("Client stats", extra={'verbose': True, 'client_stats': get_weather_client().stats()})
         return [TextContent(type="text", text=text)]
 
     except WeatherAPIError as e:
-        logger.error(f"Weather API error: {e}")
+        logger.error("Weather API error: %s", e)
         return [TextContent(type="text", text=f"天気予報APIエラー: {str(e)}")]
     except Exception as e:
-        logger.exception(f"Unexpected error: {e}")
+        logger.exception("Unexpected error: %s", e)
         return [TextContent(type="text", text=f"予期しないエラー: {str(e)}")]
 
 
@@ -315,6 +580,8 @@ async def handle_get_weather_by_city(arguments: dict[str, Any]) -> list[TextCont
     hours = arguments.get("hours", 24)
     output_format = arguments.get("format", "text")
 
+    from city_coordinates import get_city_coordinates, search_city
+
     # 都市の座標を取得
     coords = get_city_coordinates(city)
     if coords is None:
@@ -335,24 +602,27 @@ async def handle_get_weather_by_city(arguments: dict[str, Any]) -> list[TextCont
     latitude, longitude = coords
 
     try:
-        logger.info(f"Fetching forecast for city={city}, lat={latitude}, lng={longitude}, hours={hours}")
+        logger.info(
+            "Fetching forecast for city=%s, lat=%s, lng=%s, hours=%s", city, latitude, longitude, hours,
+            extra={'verbose': True}
+        )
 
-        forecast = weather_client.get_forecast(latitude, longitude, hours)
+        # 上流リクエストは共有スケジューラーの interactive レーンで実行（待機中もイベントループを止めない）
+        forecast = await asyncio.to_thread(
+            get_weather_client().get_forecast, latitude, longitude, hours, deadline=TOOL_DEADLINE
+        )
 
-        if output_format == "json":
-            result = format_forecast_json(forecast, city)
-            text = json.dumps(result, ensure_ascii=False, indent=2)
-        else:
-            text = format_forecast_summary(forecast, city)
+        text = render_forecast(forecast, output_format, city)
 
-        logger.info(f"Forecast retrieved successfully for {city}: {len(forecast)} hours")
+        logger.info("Forecast retrieved successfully for %s: %d hours", city, len(forecast))
+        logger.info("Client stats", extra={'verbose': True, 'client_stats': get_weather_client().stats()})
         return [TextContent(type="text", text=text)]
 
     except WeatherAPIError as e:
-        logger.error(f"Weather API error for {city}: {e}")
+        logger.error("Weather API error for %s: %s", city, e)
         return [TextContent(type="text", text=f"天気予報APIエラー: {str(e)}")]
     except Exception as e:
-        logger.exception(f"Unexpected error for {city}: {e}")
+        logger.exception("Unexpected error for %s: %s", city, e)
         return [TextContent(type="text", text=f"予期しないエラー: {str(e)}")]
 
 
@@ -360,11 +630,13 @@ async def handle_list_available_cities() -> list[TextContent]:
     """
     利用可能な都市のリストを取得
     """
+    from city_coordinates import get_available_cities
+
     cities = get_available_cities()
     text = f"# 利用可能な都市 ({len(cities)}件)\n\n"
     text += "、".join(cities)
 
-    logger.info(f"Listed {len(cities)} available cities")
+    logger.info("Listed %d available cities", len(cities))
     return [TextContent(type="text", text=text)]
 
 
@@ -372,6 +644,8 @@ async def handle_search_cities(arguments: dict[str, Any]) -> list[TextContent]:
     """
     都市を検索
     """
+    from city_coordinates import search_city
+
     query = arguments["query"]
     results = search_city(query)
 
@@ -381,7 +655,67 @@ async def handle_search_cities(arguments: dict[str, Any]) -> list[TextContent]:
     else:
         text = f"'{query}' に一致する都市が見つかりませんでした。"
 
-    logger.info(f"City search for '{query}': {len(results)} results")
+    logger.info("City search for '%s': %d results", query, len(results))
+    return [TextContent(type="text", text=text)]
+
+
+async def handle_check_weather_alerts(arguments: dict[str, Any]) -> list[TextContent]:
+    """
+    複数都市の予報にアラートルールを適用
+    """
+    from city_coordinates import get_available_cities, get_city_coordinates
+
+    # 省略時は英語表記の別名を除いた全都市
+    cities = arguments.get("cities") or [city for city in get_available_cities() if not city.isascii()]
+    rule_names = tuple(arguments.get("rules") or ALERT_RULE_LABELS)
+    hours = arguments.get("hours", 48)
+    output_format = arguments.get("format", "text")
+
+    unknown_rules = [name for name in rule_names if name not in ALERT_RULE_LABELS]
+    if unknown_rules:
+        return [TextContent(type="text", text=f"エラー: 不明なルール {', '.join(unknown_rules)}")]
+
+    failures: dict[str, str] = {}
+    located = []
+    for city in cities:
+        coords = get_city_coordinates(city)
+        if coords is None:
+            failures[city] = "都市が見つかりません"
+        else:
+            located.append((city, coords))
+
+    logger.info("Checking %d rules for %d cities, hours=%s", len(rule_names), len(located), hours,
+                extra={'verbose': True})
+
+    # 都市ごとの取得を並列に実行（上流の同時リクエスト数は共有スケジューラーが調整）
+    client = get_weather_client()
+    results = await asyncio.gather(*(
+        asyncio.to_thread(client.get_forecast, lat, lng, hours, deadline=TOOL_DEADLINE)
+        for _, (lat, lng) in located
+    ), return_exceptions=True)
+
+    forecasts = []
+    for (city, _), result in zip(located, results):
+        if isinstance(result, Exception):
+            failures[city] = str(result)
+        else:
+            forecasts.append((city, result))
+
+    events = get_alert_rules(rule_names).evaluate(forecasts)
+
+    logger.info("Alert check finished: %d events, %d failures", len(events), len(failures))
+
+    if output_format == "json":
+        text = json_codec.dumps({
+            "hours": hours,
+            "rules": list(rule_names),
+            "cities": len(cities),
+            "events": [event.to_dict() for event in events],
+            "failures": failures,
+        }, indent=True)
+    else:
+        text = format_alerts(events, failures, cities, hours)
+
     return [TextContent(type="text", text=text)]
 
 
@@ -389,7 +723,12 @@ async def main():
     """
     MCPサーバーを起動
     """
+    import mcp.server.stdio
+
+    configure_logging()
     logger.info("Weather Forecast MCP Server starting...")
+    if API_TOKEN == 'api_sample':
+        logger.warning('⚠️ サンプルトークンを使用しています。環境変数 WEATHER_API_TOKEN を設定してください。')
     logger.info(f"API Token: {'***' if API_TOKEN != 'api_sample' else 'api_sample (warning: using sample token)'}")
 
     async with mcp.server.stdio.stdio_server() as (read_stream, write_stream):
@@ -402,5 +741,4 @@ async def main():
 
 
 if __name__ == "__main__":
-    import asyncio
     asyncio.run(main())